@@ -0,0 +1,94 @@
+#!/usr/bin/python
+
+# Throughput benchmark of the host driver against scarf_uart_emulator, no board needed.
+# Reports frames/s, bytes/s and per-call latency of read_list/write_list (and the read_bytes/write_bytes buffer path) for several chunk sizes,
+# and of scarf_uart_batch transactions for several batch sizes.
+# --metrics adds where the time went (uart wire time, waiting on the port, framing sleeps) per slave and operation.
+
+import argparse, random, time
+from scarf_uart_emulator import scarf_uart_emulator
+from scarf_uart_slave import scarf_uart_slave
+from scarf_uart_batch import scarf_uart_batch
+from scarf_uart_metrics import scarf_uart_metrics
+
+parser = argparse.ArgumentParser(description='scarf_uart_slave throughput benchmark, run against the pure python emulator')
+parser.add_argument('--baudrate',    type=int,   default=1000000,           help='emulated uart baudrate')
+parser.add_argument('--repeats',     type=int,   default=20,                help='calls per measurement')
+parser.add_argument('--num_bytes',   type=int,   default=256,               help='bytes per read_list/write_list call')
+parser.add_argument('--chunk_sizes', type=int,   default=[8, 16, 32, 59],   nargs='+', help='read_buffer_max/write_buffer_max values')
+parser.add_argument('--batch_sizes', type=int,   default=[1, 2, 4, 8, 16],  nargs='+', help='write+read pairs per batch')
+parser.add_argument('--usb_latency', type=float, default=0.001,             help='emulated usb-serial latency in seconds')
+parser.add_argument('--framing',     type=str,   default='protocol',        help="'protocol' or 'sleep'")
+parser.add_argument('--metrics',     type=str,   default=None,              nargs='?', const='', help='print the frame metrics, and save them to a .json or .csv file if one is given')
+args = parser.parse_args()
+
+emulator = scarf_uart_emulator(baudrate=args.baudrate, usb_latency=args.usb_latency)
+metrics  = scarf_uart_metrics() if (args.metrics is not None) else None
+trigger  = scarf_uart_slave(slave_id=0x01, num_addr_bytes=1, port=emulator, framing=args.framing, usb_latency=args.usb_latency + 0.002, metrics=metrics)
+pat_gen  = scarf_uart_slave(slave_id=0x02, num_addr_bytes=1, port=emulator, framing=args.framing, usb_latency=args.usb_latency + 0.002, metrics=metrics)
+bram     = scarf_uart_slave(slave_id=0x03, num_addr_bytes=1, port=emulator, framing=args.framing, usb_latency=args.usb_latency + 0.002, metrics=metrics)
+
+# run "function" args.repeats times, return the per-call latencies and the emulator frame and byte counts
+def measure(function):
+	frames = emulator.rx_frames
+	rx_bytes = emulator.rx_bytes
+	tx_bytes = emulator.tx_bytes
+	latencies = []
+	for repeat in range(args.repeats):
+		start_time = time.perf_counter()
+		function()
+		latencies.append(time.perf_counter() - start_time)
+	return (latencies, emulator.rx_frames - frames, emulator.rx_bytes - rx_bytes + emulator.tx_bytes - tx_bytes)
+
+def report(name, latencies, frames, num_bytes):
+	total_time = sum(latencies)
+	latencies  = sorted(latencies)
+	print("{:<28s} {:>10.0f} {:>12.0f} {:>10.3f} {:>10.3f} {:>10.3f}".format(name, frames / total_time, num_bytes / total_time,
+	      1000.0 * latencies[len(latencies) // 2], 1000.0 * latencies[int(len(latencies) * 0.95)], 1000.0 * latencies[-1]))
+
+print("{:<28s} {:>10s} {:>12s} {:>10s} {:>10s} {:>10s}".format('', 'frames/s', 'bytes/s', 'p50 ms', 'p95 ms', 'max ms'))
+write_byte_list = [random.randint(0,255) for _ in range(args.num_bytes)]
+write_bytes     = bytes(write_byte_list)
+read_buffer     = bytearray(args.num_bytes)
+for chunk_size in args.chunk_sizes:
+	bram.read_buffer_max  = chunk_size
+	bram.write_buffer_max = chunk_size
+	report("write_list {:d}B chunk {:d}".format(args.num_bytes, chunk_size), *measure(lambda: bram.write_list(addr=0x00, write_byte_list=write_byte_list)))
+	report("read_list  {:d}B chunk {:d}".format(args.num_bytes, chunk_size), *measure(lambda: bram.read_list(addr=0x00, num_bytes=args.num_bytes)))
+	if (bram.read_list(addr=0x00, num_bytes=args.num_bytes) != write_byte_list):
+		print("Error: bram read data does not match the write data with chunk size {:d}".format(chunk_size))
+	report("write_bytes {:d}B chunk {:d}".format(args.num_bytes, chunk_size), *measure(lambda: bram.write_bytes(addr=0x00, data=write_bytes)))
+	report("read_bytes  {:d}B chunk {:d}".format(args.num_bytes, chunk_size), *measure(lambda: bram.read_bytes(addr=0x00, num_bytes=args.num_bytes, out=read_buffer)))
+	if (bram.write_bytes_verified(addr=0x00, data=write_bytes) != []):
+		print("Error: write_bytes_verified failed with chunk size {:d}".format(chunk_size))
+
+# each batch entry is a 9 byte trigger write and a 6 byte pat_gen read, the slaves alternate like a scenario setup
+def send_batch(batch_size):
+	batch = scarf_uart_batch()
+	for index in range(batch_size):
+		batch.write_list(trigger, addr=0, write_byte_list=[1, 2, 0, 2, 18, 0, 0, 1, 0])
+		batch.read_list(pat_gen, addr=0, num_bytes=6)
+	batch.send()
+
+def send_single(batch_size):
+	for index in range(batch_size):
+		trigger.write_list(addr=0, write_byte_list=[1, 2, 0, 2, 18, 0, 0, 1, 0])
+		pat_gen.read_list(addr=0, num_bytes=6)
+
+for batch_size in args.batch_sizes:
+	report("batch  {:d} write+read".format(batch_size), *measure(lambda: send_batch(batch_size)))
+	report("single {:d} write+read".format(batch_size), *measure(lambda: send_single(batch_size)))
+
+if (emulator.rx_dropped > 0):
+	print("Error: the emulator dropped {:d} bytes that arrived while it was sending read data".format(emulator.rx_dropped))
+
+if (metrics is not None):
+	print()
+	print("{:<22s} {:>8s} {:>10s} {:>10s} {:>10s} {:>10s} {:>10s} {:>11s}".format('slave_id operation', 'frames', 'bytes', 'total s', 'wire s', 'wait s', 'sleep s', 'short reads'))
+	for row in metrics.summary():
+		print("0x{:02x}     {:<13s} {:>8d} {:>10d} {:>10.3f} {:>10.3f} {:>10.3f} {:>10.3f} {:>11d}".format(row['slave_id'], row['operation'], row['frames'], row['bytes_sent'] + row['bytes_received'],
+		      row['total_time'], row['wire_time'], row['wait_time'], row['sleep_time'], row['short_reads']))
+	if args.metrics.endswith('.json'):
+		metrics.to_json(args.metrics)
+	elif args.metrics.endswith('.csv'):
+		metrics.to_csv(args.metrics)
@@ -0,0 +1,133 @@
+#!/usr/bin/python
+
+# Cross-check of trigger_model.trigger_times() against a clock by clock simulation of trigger.sv, no board needed.
+# simulate() is written straight from the RTL (every flop of trigger.sv, with the synchronizer in front of trigger_source)
+# and shares no code with trigger_model.py, so run this after a change to either of them.
+# The trigger_scenarios.py table is checked first, then random enabled configs on random pulse trains, "--groups" waveforms
+# with "--configs" configs each. Exits with 1 if any config fires at different times in the two models.
+
+import argparse, sys
+import numpy as np
+from pattern_compiler import clk_freq
+from trigger_model import trigger_times
+from trigger_scenarios import scenarios, scenario_registers, scenario_waveform
+
+parser = argparse.ArgumentParser(description='check trigger_model.py against a cycle accurate simulation of trigger.sv')
+parser.add_argument('--groups',  type=int, default=12,  help='random waveforms')
+parser.add_argument('--configs', type=int, default=100, help='random trigger configs per waveform')
+parser.add_argument('--pulses',  type=int, default=30,  help='pulses per random waveform')
+parser.add_argument('--seed',    type=int, default=1,   help='random seed')
+args = parser.parse_args()
+
+# trigger_out rising edge clocks of every config, one list per row of "registers" (an (N, 9) array of trigger register bytes).
+# "levels" is trigger_source at every fpga clock, the registers are written long before the first clock
+def simulate(levels, registers):
+	(positive, cfg_type, stage1, time_base, count1, count2, no_edge, dur_sel, enable) = [registers[:, index] for index in range(9)]
+	positive = positive == 1
+	enable   = enable == 1
+	no_edge  = no_edge == 1
+	num_configs = len(registers)
+	final_stage1_count = np.where(stage1 > 0, stage1 - 1, 0)
+	end_time_base_cnt  = 10 ** time_base - 1
+	trig_end_cnt       = np.where(dur_sel == 1, 99, 9)
+	count1_step = (count1 > 0) & (cfg_type > 0)
+	count2_step = (count2 > 0) & (cfg_type > 2)
+	# flops, all reset to zero
+	sync = [0, 0] # u_synchronizer_gpio_in
+	hold_trigger_source = np.zeros(num_configs, dtype=bool)
+	en_time_base_cnt    = np.zeros(num_configs, dtype=bool)
+	stage1_counter      = np.zeros(num_configs, dtype=np.int64)
+	time_base_cnt       = np.zeros(num_configs, dtype=np.int64)
+	count               = np.zeros(num_configs, dtype=np.int64)
+	trigger_out         = np.zeros(num_configs, dtype=bool)
+	trig_duration       = np.zeros(num_configs, dtype=np.int64)
+	rising = [[] for _ in range(num_configs)]
+	for clock in range(len(levels)):
+		trigger_source_sync = sync[1] == 1
+		pos_edge = trigger_source_sync & ~hold_trigger_source
+		neg_edge = ~trigger_source_sync & hold_trigger_source
+		opposite_edge = (positive & neg_edge) | (~positive & pos_edge)
+		type0_trig = (cfg_type == 0) & ((positive & pos_edge) | (~positive & neg_edge))
+		type1_trig = en_time_base_cnt & (cfg_type == 1) & (count <= count1) & opposite_edge
+		type2_trig = en_time_base_cnt & (cfg_type == 2) & (count >= count1) & (no_edge | opposite_edge)
+		type3_trig = en_time_base_cnt & (cfg_type == 3) & (count >= count1) & (count <= count2) & opposite_edge
+		type4_trig = en_time_base_cnt & (cfg_type == 4) & (((count <= count1) & opposite_edge) | ((count >= count2) & (no_edge | opposite_edge)))
+		any_trig = type0_trig | type1_trig | type2_trig | type3_trig | type4_trig
+		reached_final_stage1_count = stage1_counter == final_stage1_count
+		toggle_time_base = np.where(count1_step & (count == count1 - 1), time_base_cnt == end_time_base_cnt - 1,
+		                   np.where(count2_step & (count == count2 - 1), time_base_cnt == end_time_base_cnt - 1, time_base_cnt == end_time_base_cnt))
+		toggle_time_base = toggle_time_base | (time_base == 0)
+		duration_done = trig_duration == trig_end_cnt
+		# next state
+		next_en = np.where((cfg_type == 0) | ~enable | trigger_out, False,
+		          np.where(positive & pos_edge, True, np.where(positive & neg_edge, False,
+		          np.where(~positive & neg_edge, True, np.where(~positive & pos_edge, False, en_time_base_cnt)))))
+		next_stage1 = np.where(~en_time_base_cnt | (cfg_type == 0) | ~enable, 0, np.where(reached_final_stage1_count, 0, stage1_counter + 1))
+		next_time_base = np.where(~en_time_base_cnt | (time_base == 0), 0, np.where(toggle_time_base, 0,
+		                 np.where((time_base_cnt < end_time_base_cnt) & reached_final_stage1_count, time_base_cnt + 1, time_base_cnt)))
+		increment = np.where(time_base == 0, reached_final_stage1_count, toggle_time_base) & (count < 255)
+		next_count = np.where(~en_time_base_cnt, 0, count + increment)
+		next_trigger_out = np.where(duration_done, False, any_trig | trigger_out)
+		next_duration = np.where(duration_done, 0, np.where(trigger_out, trig_duration + 1, trig_duration))
+		hold_trigger_source = trigger_source_sync & enable
+		(en_time_base_cnt, stage1_counter, time_base_cnt, count) = (next_en, next_stage1, next_time_base, next_count)
+		for row in np.flatnonzero(next_trigger_out & ~trigger_out):
+			rising[row].append(clock + 1)
+		(trigger_out, trig_duration) = (next_trigger_out, next_duration)
+		sync = [int(levels[clock]), sync[0]]
+	return rising
+
+# trigger_source at every clock for a (edge times, initial level) waveform, with "tail" clocks after the final edge
+def waveform_levels(waveform, tail):
+	(edge_times, initial_level) = waveform
+	edges = np.rint(np.sort(np.asarray(edge_times, dtype=np.float64)) * clk_freq).astype(np.int64)
+	toggles = np.zeros((edges[-1] if (len(edges) > 0) else 0) + tail, dtype=np.int64)
+	np.add.at(toggles, edges, 1)
+	return (np.cumsum(toggles) + initial_level) & 1
+
+# clocks a config can count for before every count value is reached, used for the simulation tail
+def longest_count(registers):
+	return int(np.max(np.maximum(registers[:, 2], 1) * (10 ** registers[:, 3]) * (np.maximum(registers[:, 4], registers[:, 5]) + 2))) + 200
+
+# random enabled configs, the counts are kept to about "max_clocks" so that they can be reached by the pulses
+def random_registers(rng, num_configs, max_clocks):
+	registers = np.zeros((num_configs, 9), dtype=np.int64)
+	registers[:, 0] = rng.integers(0, 2, num_configs)
+	registers[:, 1] = rng.integers(0, 5, num_configs)
+	registers[:, 2] = rng.integers(0, 4, num_configs)
+	registers[:, 3] = rng.integers(0, 3, num_configs)
+	step = np.maximum(registers[:, 2], 1) * (10 ** registers[:, 3])
+	max_count = np.minimum(255, max_clocks // step)
+	registers[:, 4] = rng.integers(0, max_count + 1)
+	registers[:, 5] = registers[:, 4] + rng.integers(0, max_count + 1)
+	registers[:, 5] = np.minimum(registers[:, 5], 255)
+	registers[:, 6] = rng.integers(0, 2, num_configs)
+	registers[:, 7] = rng.integers(0, 2, num_configs)
+	registers[:, 8] = 1
+	return registers
+
+# pulse widths between 1 and "max_clocks" fpga clocks, spread evenly on a log scale
+def random_waveform(rng, num_pulses, max_clocks):
+	widths = np.rint(np.exp(rng.uniform(0.0, np.log(max_clocks), 2 * num_pulses))).astype(np.int64)
+	return (np.cumsum(widths) / clk_freq, int(rng.integers(0, 2)))
+
+# number of configs whose trigger_out edges differ between the two models, the first few are printed
+def compare(name, waveform, registers):
+	rising = simulate(waveform_levels(waveform, longest_count(registers)), registers)
+	times = trigger_times(waveform, registers)
+	failures = 0
+	for row in range(len(registers)):
+		model = [int(clock) for clock in np.rint(times[row][~np.isnan(times[row])] * clk_freq)]
+		if (model != rising[row]):
+			failures += 1
+			if (failures <= 5):
+				print("Error: {} config {} fires at clocks {} in trigger.sv and {} in trigger_model.py".format(name, registers[row].tolist(), rising[row], model))
+	print("{:<16s} {:5d} configs, {:5d} trigger_out edges, {:d} mismatches".format(name, len(registers), sum([len(clocks) for clocks in rising]), failures))
+	return failures
+
+rng = np.random.default_rng(args.seed)
+failures = compare('scenarios', scenario_waveform(), np.array([scenario_registers(scenarios[name])[0] for name in scenarios], dtype=np.int64))
+for group in range(args.groups):
+	max_clocks = int(rng.choice([30, 300, 3000]))
+	failures += compare('random {:d}'.format(group), random_waveform(rng, args.pulses, max_clocks), random_registers(rng, args.configs, max_clocks))
+sys.exit(1 if (failures > 0) else 0)
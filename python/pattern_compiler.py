@@ -0,0 +1,111 @@
+import numpy as np
+
+# Compile per-pin waveforms into block ram bytes and pat_gen register values for pattern_gen.sv.
+# The coarsest timestep (stage1_count * 10^timestep fpga clocks) that puts every edge exactly on a step is used, with the
+# narrowest gpio width (1, 2, 4 or 8 pins) that holds every active pin. This keeps the pattern as short as possible,
+# so longer waveforms fit in the 256 byte block_ram and fewer bytes cross the uart.
+#
+#   (bram_list, pat_gen_list) = compile_pulses([[30E-6, 10E-6, 20E-6, 10E-6, 10E-6]], initial_levels=[1])
+#   bram.write_list(addr=0, write_byte_list=bram_list)
+#   pat_gen.write_list(addr=0, write_byte_list=pat_gen_list)
+
+clk_freq = 100.0E6 # trigger_uart_top.sv runs pattern_gen from the 100MHz pll
+
+# 2'b00 is 1 pin, 2'b01 is 2 pins, 2'b10 is 4 pins and 2'b11 is 8 pins
+num_gpio = [1, 2, 4, 8]
+
+# every step size pattern_gen.sv can make, index [stage1_count - 1][timestep]. stage1_count 0 and 1 both divide by 1
+step_clocks = np.arange(1, 32, dtype=np.int64)[:, None] * (10 ** np.arange(8, dtype=np.int64))[None, :]
+
+# seconds to fpga clocks, None if a time is not on a clock edge
+def to_clocks(times):
+	clocks  = np.asarray(times, dtype=np.float64) * clk_freq
+	rounded = np.rint(clocks)
+	if np.any(np.abs(clocks - rounded) > 1.0E-3):
+		return None
+	return rounded.astype(np.int64)
+
+# "edges" has one list of toggle times (seconds) per pin, pin 0 is pat_gen_out[0]. initial_levels (default all 0) are the
+# pin levels at time 0. duration is the pattern length, the default holds the levels after the final edge for one step.
+# Returns (bram byte list, pat_gen register list for addresses 0 to 5) or None if the waveform can not be made
+def compile_edges(edges, initial_levels=None, duration=None, ram_size=256):
+	if (len(edges) == 0) or (len(edges) > 8):
+		print("Error: between 1 and 8 pins are supported, {:d} given".format(len(edges)))
+		return None
+	if (initial_levels is None):
+		initial_levels = [0] * len(edges)
+	pin_clocks = []
+	for pin_edges in edges:
+		clocks = to_clocks(np.sort(np.asarray(pin_edges, dtype=np.float64)))
+		if (clocks is None) or np.any(clocks < 0):
+			print("Error: edge times must be positive multiples of the {:.0f}ns fpga clock".format(1.0E9 / clk_freq))
+			return None
+		pin_clocks.append(clocks)
+	all_clocks = np.concatenate(pin_clocks)
+	if (duration is not None):
+		duration_clocks = to_clocks([duration])
+		if (duration_clocks is None) or (len(all_clocks) > 0 and duration_clocks[0] <= np.max(all_clocks)):
+			print("Error: duration must be a multiple of the fpga clock and longer than the final edge")
+			return None
+		all_clocks = np.concatenate([all_clocks, duration_clocks])
+	all_clocks = all_clocks[all_clocks > 0]
+	if (len(all_clocks) == 0):
+		print("Error: the waveform has no edges and no duration")
+		return None
+	# the coarsest step that divides every edge time, a larger timestep is preferred over a larger stage1_count
+	common_clocks = int(np.gcd.reduce(all_clocks))
+	valid = (common_clocks % step_clocks) == 0
+	step = int(np.max(step_clocks[valid]))
+	candidates = np.argwhere(valid & (step_clocks == step))
+	(stage1_index, timestep) = candidates[np.argmax(candidates[:, 1])]
+	if (duration is None):
+		duration_clocks = int(np.max(all_clocks)) + step
+	else:
+		duration_clocks = int(duration_clocks[0])
+	# the narrowest gpio width that holds the highest pin that ever goes high
+	active_pins = [pin for pin in range(len(edges)) if (len(pin_clocks[pin]) > 0) or (initial_levels[pin] == 1)]
+	num_pins = max(active_pins) + 1 if (len(active_pins) > 0) else 1
+	num_gpio_sel = [sel for sel in range(len(num_gpio)) if (num_gpio[sel] >= num_pins)][0]
+	# sample every pin at each step, an edge at a step time sets the level of that step
+	step_times = np.arange(duration_clocks // step, dtype=np.int64) * step
+	samples = np.zeros((len(step_times), num_gpio[num_gpio_sel]), dtype=np.uint8)
+	for pin in range(len(edges)):
+		samples[:, pin] = (np.searchsorted(pin_clocks[pin], step_times, side='right') + initial_levels[pin]) & 1
+	# pattern_gen.sv drives the msb first, with pin 0 on the most significant bit of each group of num_gpio bits
+	bram_bytes = np.packbits(samples.reshape(-1))
+	# cfg_end_address_pat_gen is the final bram address (inclusive) and only 8 bits
+	if (len(bram_bytes) > min(ram_size, 256)):
+		print("Error: pattern needs {:d} bytes, the block ram holds {:d}".format(len(bram_bytes), min(ram_size, 256)))
+		return None
+	stage1_count = int(stage1_index) + 1 if (stage1_index > 0) else 0
+	# the pins return low once pattern_active falls after the final byte
+	bram_list    = bram_bytes.tolist()
+	#               end_address,         num_gpio,     timestep,      stage1_count, repeat_enable, enable
+	pat_gen_list = [len(bram_bytes) - 1, num_gpio_sel, int(timestep), stage1_count, 0,             1]
+	return (bram_list, pat_gen_list)
+
+# "widths" has one list of level durations (seconds) per pin, the first one is at the initial level and each following
+# one toggles the pin. The longest pin sets the pattern length, shorter pins hold their final level until the end
+def compile_pulses(widths, initial_levels=None, ram_size=256):
+	edges = []
+	duration = 0.0
+	for pin_widths in widths:
+		pin_times = np.cumsum(np.asarray(pin_widths, dtype=np.float64))
+		edges.append(pin_times[:-1])
+		if (len(pin_times) > 0):
+			duration = max(duration, pin_times[-1])
+	return compile_edges(edges, initial_levels=initial_levels, duration=duration if (duration > 0.0) else None, ram_size=ram_size)
+
+# time of one pattern step in seconds
+def step_time(pat_gen_list):
+	return max(pat_gen_list[3], 1) * (10 ** pat_gen_list[2]) / clk_freq
+
+# the waveform of one pin, as (edge times in seconds, initial level). The pins return low after the pattern,
+# so a final falling edge is included if the pin ends high
+def pattern_waveform(bram_list, pat_gen_list, pin=0):
+	num_pins = num_gpio[pat_gen_list[1]]
+	bits = np.unpackbits(np.asarray(bram_list[:pat_gen_list[0] + 1], dtype=np.uint8))
+	levels = bits.reshape(-1, num_pins)[:, pin].astype(np.int8)
+	levels = np.concatenate([levels, [0]])
+	edge_steps = np.flatnonzero(np.diff(levels)) + 1
+	return (edge_steps * step_time(pat_gen_list), int(levels[0]))
@@ -0,0 +1,123 @@
+#!/usr/bin/python
+
+# Run the trigger_scenarios.py test matrix on every attached board at once, with one worker thread per port.
+# A port is only used after read_id returns the trigger, pat_gen and bram slave ids.
+# By default every board runs every scenario, --spread shares the scenarios out between the boards instead.
+# A scenario passes when the trigger, bram and pat_gen registers read back as written before the pattern is started,
+# the trigger_out pulses themselves still need a logic analyzer, the report lists where trigger_model.py expects them.
+
+import argparse, queue, sys, time
+from concurrent.futures import ThreadPoolExecutor
+from scarf_uart_slave import scarf_uart_slave
+from scarf_uart_batch import scarf_uart_batch
+from trigger_scenarios import scenarios, scenario_registers, scenario_triggers, pattern_time
+
+parser = argparse.ArgumentParser(description='run the trigger scenario matrix on several tang nano boards in parallel')
+parser.add_argument('--ports',     type=str,   default=None, nargs='+', help='serial ports to use, default is every port that answers read_id')
+parser.add_argument('--scenarios', type=str,   default=list(scenarios.keys()), nargs='+', help='scenario names from trigger_scenarios.py')
+parser.add_argument('--spread',    action='store_true',                  help='run each scenario once, on whichever board is free')
+parser.add_argument('--settle',    type=float, default=0.01,             help='seconds to wait after the pattern before the next scenario')
+parser.add_argument('--emulate',   type=int,   default=0,                help='use this many scarf_uart_emulator boards instead of serial ports')
+args = parser.parse_args()
+
+class trigger_board:
+
+	# Constructor, no shadows as the register read back is the check
+	def __init__(self, port):
+		self.name    = port if isinstance(port, str) else "emulator{:d}".format(id(port) % 1000)
+		self.trigger = scarf_uart_slave(slave_id=0x01, num_addr_bytes=1, port=port)
+		self.pat_gen = scarf_uart_slave(slave_id=0x02, num_addr_bytes=1, port=port)
+		self.bram    = scarf_uart_slave(slave_id=0x03, num_addr_bytes=1, port=port)
+		self.results = [] # (scenario name, passed, setup time in seconds)
+
+	# True if the fpga on this port answers with the slave ids 1, 2 and 3
+	def check_ids(self):
+		batch = scarf_uart_batch()
+		batch.read_id(self.trigger)
+		batch.read_id(self.pat_gen)
+		batch.read_id(self.bram)
+		return (batch.send() == [1, 2, 3])
+
+	def run_scenario(self, name):
+		start_time = time.perf_counter()
+		(trigger_list, bram_list, pat_gen_list) = scenario_registers(scenarios[name])
+		# configure everything but the pat_gen enable and read it back, bram and pat_gen can not be read once the pattern is active
+		batch = scarf_uart_batch()
+		batch.write_list(self.trigger, addr=0, write_byte_list=trigger_list)
+		batch.write_list(self.bram,    addr=0, write_byte_list=bram_list)
+		batch.write_list(self.pat_gen, addr=0, write_byte_list=pat_gen_list[:5])
+		batch.read_list(self.trigger, addr=0, num_bytes=len(trigger_list))
+		batch.read_list(self.bram,    addr=0, num_bytes=len(bram_list))
+		batch.read_list(self.pat_gen, addr=0, num_bytes=5)
+		passed = (batch.send() == [trigger_list, bram_list, pat_gen_list[:5]])
+		batch.write_list(self.pat_gen, addr=5, write_byte_list=[1]) # rising edge starts the pattern
+		batch.send()
+		setup_time = time.perf_counter() - start_time
+		time.sleep(pattern_time(scenarios[name]) + args.settle)
+		batch.write_list(self.pat_gen, addr=5, write_byte_list=[0]) # disable pat_gen, this is needed before it is re-enabled
+		batch.write_list(self.trigger, addr=8, write_byte_list=[0]) # turn-off trigger
+		batch.send()
+		self.results.append((name, passed, setup_time))
+
+	# run scenario names from "work" (a list, or a queue.Queue shared with the other boards) until there are none left
+	def run(self, work):
+		if isinstance(work, list):
+			for name in work:
+				self.run_scenario(name)
+			return
+		while True:
+			try:
+				name = work.get_nowait()
+			except queue.Empty:
+				return
+			self.run_scenario(name)
+
+def discover_ports():
+	if (args.emulate > 0):
+		from scarf_uart_emulator import scarf_uart_emulator
+		return [scarf_uart_emulator() for _ in range(args.emulate)]
+	if (args.ports is not None):
+		return args.ports
+	from serial.tools import list_ports
+	return sorted([port_info.device for port_info in list_ports.comports()])
+
+boards = []
+for port in discover_ports():
+	try:
+		board = trigger_board(port)
+		if board.check_ids():
+			boards.append(board)
+		else:
+			board.trigger.port.close()
+			print("Skipping {}, the slave ids are not 1, 2 and 3 (not a programmed board)".format(board.name))
+	except Exception as exception:
+		print("Skipping {}, {}".format(port, exception))
+if (len(boards) == 0):
+	print("Error: no boards found")
+	sys.exit(1)
+
+if (args.spread == True):
+	work = queue.Queue()
+	for name in args.scenarios:
+		work.put(name)
+else:
+	work = None
+start_time = time.perf_counter()
+with ThreadPoolExecutor(max_workers=len(boards)) as pool:
+	futures = [pool.submit(board.run, list(args.scenarios) if (work is None) else work) for board in boards]
+	for future in futures:
+		future.result()
+total_time = time.perf_counter() - start_time
+
+failures = 0
+for board in boards:
+	print("{}:".format(board.name))
+	for (name, passed, setup_time) in board.results:
+		expected = ", ".join(["{:.2f}".format(1.0E6 * time) for time in scenario_triggers(scenarios[name])])
+		print("  {:<4s} {:<24s} setup {:7.2f} ms, trigger_out expected at [{}] us".format('PASS' if passed else 'FAIL', name, 1000.0 * setup_time, expected))
+	num_passed = len([result for result in board.results if result[1]])
+	failures += len(board.results) - num_passed
+	print("  {:d} of {:d} scenarios passed, {:.3f} s of setup".format(num_passed, len(board.results), sum([result[2] for result in board.results])))
+	board.trigger.port.close()
+print("{:d} boards, {:d} failures, {:.3f} s total".format(len(boards), failures, total_time))
+sys.exit(1 if (failures > 0) else 0)
@@ -0,0 +1,127 @@
+# Queue frames for several scarf_uart_slave objects on the same port and send them as one transaction.
+# The port lock is held for the whole transaction, so other threads can not put frames in between.
+# No frame waits for a read response. Writes are followed by the idle gap that uart_rx.sv needs for its block timeout,
+# reads are followed by the time the fpga needs to send the response (it ignores rx bytes until the read data is sent).
+# All the read responses are collected with one port read at the end and split up using the slave_id echo byte.
+
+import time
+
+class scarf_uart_batch:
+
+	# Constructor
+	def __init__(self, debug=False):
+		self.frames      = [] # (slave, frame, step_size, result_index), result_index is None for writes
+		self.num_results = 0
+		self.id_results  = [] # result indexes that return the echoed slave_id instead of read data
+		self.pending     = {} # id of slave -> (slave, dict of address -> queued write value), the shadow is updated after send()
+		self.debug       = debug
+
+	# queue a write, this routine allows "write_byte_list" to be larger than the slave write_buffer_max.
+	# When the slave has a shadow only the bytes that differ from the shadow and the earlier queued writes are queued
+	def write_list(self, slave, addr=0x00, write_byte_list=[]):
+		if id(slave) not in self.pending:
+			self.pending[id(slave)] = (slave, {})
+		pending = self.pending[id(slave)][1]
+		for (frame, step_size) in slave.dirty_write_frames(addr, write_byte_list, pending=pending):
+			self.frames.append((slave, frame, step_size, None))
+		for (offset, data) in enumerate(write_byte_list):
+			pending[addr + offset] = data
+		return 1
+
+	# store the queued write values in the slave shadows once they are sent, or mark them unknown if "sent" is False
+	def update_shadows(self, pending, sent):
+		for (slave, values) in pending.values():
+			for (address, data) in values.items():
+				slave.update_shadow(address, [data if sent else None])
+
+	# queue a read, the returned index selects the read data in the list returned by send()
+	def read_list(self, slave, addr=0x00, num_bytes=1):
+		if (num_bytes == 0):
+			print("Error: num_bytes must be larger than zero")
+			return None
+		result_index = self.num_results
+		self.num_results += 1
+		for (frame, step_size) in slave.read_frames(addr, num_bytes):
+			self.frames.append((slave, frame, step_size, result_index))
+		return result_index
+
+	# queue a slave_id check, the result is the echoed slave_id (see scarf_uart_slave.read_id) or None if there was no echo
+	def read_id(self, slave):
+		result_index = self.num_results
+		self.num_results += 1
+		self.id_results.append(result_index)
+		byte0 = (slave.slave_id + 0x80) & 0xFF
+		self.frames.append((slave, bytearray([byte0] + [0x00, 0x01]), 1, result_index))
+		return result_index
+
+	# send all the queued frames and return a list with one entry per queued read, in the order they were queued
+	def send(self):
+		frames     = self.frames
+		id_results = self.id_results
+		results    = [None if (result_index in id_results) else [] for result_index in range(self.num_results)]
+		pending    = self.pending
+		self.frames      = []
+		self.num_results = 0
+		self.id_results  = []
+		self.pending     = {}
+		if (len(frames) == 0):
+			self.update_shadows(pending, True) # every queued write matched the shadow
+			return results
+		slave = frames[0][0]
+		port  = slave.port
+		for (frame_slave, frame, step_size, result_index) in frames:
+			if (frame_slave.port is not port):
+				print("Error: all slaves in a batch must share one port")
+				self.update_shadows(pending, False)
+				return results
+		read_frames = [(frame_slave, step_size, result_index, result_index in id_results) for (frame_slave, frame, step_size, result_index) in frames if (result_index is not None)]
+		min_bytes = 0
+		max_bytes = 0
+		with port.lock:
+			try:
+				port.reset_input_buffer()
+				for (frame_slave, frame, step_size, result_index) in frames:
+					if (result_index is None):
+						frame_slave.send_frame(frame)
+					else:
+						frame_slave.send_frame(frame, response_bytes=1 + frame_slave.num_addr_bytes + step_size)
+						min_bytes += 1 + step_size
+						max_bytes += 1 + frame_slave.num_addr_bytes + step_size
+			except BaseException:
+				self.update_shadows(pending, False)
+				raise
+			self.update_shadows(pending, True)
+			if (len(read_frames) == 0):
+				return results
+			start_time = time.perf_counter()
+			response = slave.receive(min_bytes, max_bytes, slave.frame_time(max_bytes) + slave.usb_latency)
+			if (slave.metrics is not None):
+				total_time = time.perf_counter() - start_time
+				slave.metrics.record(slave.slave_id, 'batch_receive', frames=0, bytes_received=len(response), wait_time=total_time, total_time=total_time, short_reads=slave.short_reads)
+		self.split_responses(response, min_bytes, read_frames, results)
+		return results
+
+	# every read response is one or more slave_id echo bytes followed by "step_size" read bytes.
+	# Extra echoes (see scarf_uart_slave.read_response) are only skipped while the response is longer than the minimum
+	def split_responses(self, response, min_bytes, read_frames, results):
+		surplus = len(response) - min_bytes
+		index = 0
+		for (slave, step_size, result_index, is_id) in read_frames:
+			echo = (slave.slave_id + 0x80) & 0xFF
+			if (index >= len(response)) or (response[index] != echo):
+				print("Error: missing slave_id 0x{:02x} echo in batch response at byte {:d}".format(slave.slave_id,index))
+				return
+			index += 1
+			while (surplus > 0) and (index < len(response)) and (response[index] == echo):
+				index += 1
+				surplus -= 1
+			if (index + step_size > len(response)):
+				print("Error: expected {:d} read bytes from slave_id 0x{:02x}, received {:d}".format(step_size,slave.slave_id,len(response) - index))
+				return
+			if (is_id == True):
+				results[result_index] = echo - 0x80
+			else:
+				results[result_index].extend(response[index:index + step_size])
+			if (self.debug == True):
+				print("Slave ID 0x{:02x} read data {}".format(slave.slave_id,list(response[index:index + step_size])))
+			index += step_size
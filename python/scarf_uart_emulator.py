@@ -0,0 +1,285 @@
+import threading
+import time
+
+# Pure python model of the trigger_uart_top.sv uart fabric, it can be passed as the port of a scarf_uart_slave.
+# It implements the uart_byte_regmap_interface.sv byte protocol: slave_id/RNW byte, address bytes, 6bit read length,
+# slave_id echo, auto-incrementing address and the uart_rx.sv block timeout. Wire timing is modelled in real time from
+# the baudrate, so a host that does not leave the idle gap between frames will see the same corruption as the fpga.
+
+# register file with a write mask per address, like regmap_trigger.sv and regmap_pattern_gen.sv
+class regmap_model:
+
+	def __init__(self, masks):
+		self.masks     = masks
+		self.registers = [0] * len(masks)
+
+	def write(self, address, data):
+		if (address < len(self.registers)):
+			self.registers[address] = data & self.masks[address]
+
+	def read(self, address):
+		if (address < len(self.registers)):
+			return self.registers[address]
+		return 0
+
+	def reset(self):
+		self.registers = [0] * len(self.masks)
+
+# byte wide block_ram.sv, the address wraps at ram_addr_bits
+class block_ram_model:
+
+	def __init__(self, ram_addr_bits=8):
+		self.ram = [0] * (2 ** ram_addr_bits)
+
+	def write(self, address, data):
+		self.ram[address % len(self.ram)] = data & 0xFF
+
+	def read(self, address):
+		return self.ram[address % len(self.ram)]
+
+	def reset(self):
+		pass # block ram is not cleared by the reset button
+
+# pattern_gen.sv only matters to the uart because pattern_active blocks pat_gen and bram reads in trigger_uart_top.sv,
+# and bram writes go to ram_addr_pat_gen while it is high. pattern_active only clears at the end of the pattern, so writing
+# cfg_enable_pat_gen (and cfg_repeat_enable_pat_gen) low mid-pattern holds the counters at zero and keeps it high, with
+# the pins frozen, until the next rising edge of the enable starts the pattern again
+class pattern_gen_model(regmap_model):
+
+	def __init__(self, clk_freq=100.0E6):
+		regmap_model.__init__(self, masks=[0xFF, 0x03, 0x07, 0x1F, 0x01, 0x01])
+		self.clk_freq      = clk_freq
+		self.start_time    = 0.0
+		self.active_until  = 0.0
+		self.frozen        = False
+
+	def step_time(self):
+		return max(self.registers[3], 1) * (10 ** self.registers[2]) / self.clk_freq
+
+	# cfg_end_address_pat_gen is inclusive
+	def pattern_duration(self):
+		return (self.registers[0] + 1) * (8 >> self.registers[1]) * self.step_time()
+
+	# the rising edge of cfg_enable_pat_gen (addr 5) starts the pattern, cfg_repeat_enable_pat_gen (addr 4) keeps it running
+	def write(self, address, data, now=0.0):
+		active = self.pattern_active(now)
+		(repeat, enable) = self.registers[4:6]
+		regmap_model.write(self, address, data)
+		if (enable == 0) and (self.registers[5] == 1):
+			self.start(now)
+		elif (repeat == 0) and (self.registers[4] == 1) and ((not active) or self.frozen):
+			self.start(now)
+		elif (repeat == 1) and (self.registers[4] == 0) and (self.registers[5] == 1):
+			passes = int((now - self.start_time) / self.pattern_duration()) + 1 # the current pass is finished
+			self.active_until = self.start_time + passes * self.pattern_duration()
+		if active and (self.registers[4] == 0) and (self.registers[5] == 0):
+			self.frozen = True
+
+	def start(self, now):
+		self.start_time   = now
+		self.active_until = now + self.pattern_duration()
+		self.frozen       = False
+
+	def pattern_active(self, now):
+		return (self.registers[4] == 1) or self.frozen or (now < self.active_until)
+
+	# the block ram address that pattern_gen.sv is reading, it is held at zero while the pattern is frozen
+	def ram_address(self, now):
+		if self.frozen:
+			return 0
+		steps = int((now - self.start_time) / self.step_time())
+		return (steps // (8 >> self.registers[1])) % (self.registers[0] + 1)
+
+	def reset(self):
+		regmap_model.reset(self)
+		self.start_time   = 0.0
+		self.active_until = 0.0
+		self.frozen       = False
+
+class scarf_uart_emulator:
+
+	# Constructor, the defaults match trigger_uart_top.sv. usb_latency delays every byte sent to the host, like a usb-serial latency timer
+	def __init__(self, baudrate=1000000, timeout=0.001, usb_latency=0.0, num_addr_bytes=1, trigger_slave_id=0x01, pat_gen_slave_id=0x02, bram_slave_id=0x03, ram_addr_bits=8):
+		self.baudrate         = baudrate
+		self.timeout          = timeout
+		self.usb_latency      = usb_latency
+		self.port             = None # no device path, scarf_uart_port shares the emulator by object
+		self.is_open          = True
+		self.num_addr_bytes   = num_addr_bytes
+		self.trigger          = regmap_model(masks=[0x01, 0x07, 0x1F, 0x07, 0xFF, 0xFF, 0x01, 0x01, 0x01])
+		self.pat_gen          = pattern_gen_model()
+		self.bram             = block_ram_model(ram_addr_bits)
+		self.trigger_slave_id = trigger_slave_id
+		self.pat_gen_slave_id = pat_gen_slave_id
+		self.bram_slave_id    = bram_slave_id
+		self.lock             = threading.Condition()
+		self.tx_queue         = [] # (time the byte has been received by the host, byte)
+		self.rx_frames        = 0  # number of slave_id/RNW bytes seen, each one starts a frame
+		self.rx_bytes         = 0
+		self.tx_bytes         = 0
+		self.rx_dropped       = 0  # bytes that arrived while the fpga was sending read data
+		self.reset()
+
+	# same as pressing button_s1, the uart state and the registers are cleared (but not the block ram)
+	def reset(self):
+		with self.lock:
+			self.count          = 0
+			self.slave_id       = 0
+			self.rnw            = 0
+			self.address        = 0
+			self.num_read_bytes = 0
+			self.line_free      = 0.0 # time the last received byte finished
+			self.tx_free        = 0.0 # time the fpga uart_tx is idle again
+			self.read_done      = 0.0 # time the final read byte started to be sent, count returns to zero
+			self.tx_queue       = []
+			self.trigger.reset()
+			self.pat_gen.reset()
+
+	def char_time(self, num_bytes=1):
+		return num_bytes * 10.0 / self.baudrate
+
+	# uart_rx.sv pulses block_timeout after the line has been idle for BIT4AT (5.5 bit periods) past frame_end (9.8 bits)
+	def block_timeout_time(self):
+		return self.char_time(0.53)
+
+	def slave(self, slave_id):
+		if (slave_id == self.trigger_slave_id):
+			return self.trigger
+		if (slave_id == self.pat_gen_slave_id):
+			return self.pat_gen
+		if (slave_id == self.bram_slave_id):
+			return self.bram
+		return None
+
+	# valid_slave_id in trigger_uart_top.sv, nothing is sent for other slave_ids or while a pattern is active
+	def valid_slave_id(self, slave_id, now):
+		if (slave_id == self.trigger_slave_id):
+			return True
+		if (slave_id == self.pat_gen_slave_id) or (slave_id == self.bram_slave_id):
+			return not self.pat_gen.pattern_active(now)
+		return False
+
+	def send(self, start_time, data):
+		self.tx_queue.append((start_time + self.char_time(1) + self.usb_latency, data))
+		self.tx_free  = start_time + self.char_time(1)
+		self.tx_bytes += 1
+
+	# one byte from the host, "now" is the time its stop bit finished
+	def receive_byte(self, data, now):
+		if (now - self.char_time(1) - self.line_free >= self.block_timeout_time()) and (self.num_read_bytes == 0):
+			self.count = 0
+		self.line_free = now
+		self.rx_bytes += 1
+		if (self.count > self.num_addr_bytes + 1):
+			self.rx_dropped += 1 # the read data is still being sent
+			return
+		if (self.count == 0):
+			self.slave_id = data & 0x7F
+			self.rnw      = data >> 7
+			self.address  = 0
+			self.rx_frames += 1
+			self.count = 1
+		elif (self.count <= self.num_addr_bytes):
+			self.address = ((self.address << 8) | data) & ((1 << (8 * self.num_addr_bytes)) - 1)
+			self.count += 1
+			if (self.count == self.num_addr_bytes + 1) and (self.rnw == 1):
+				if self.valid_slave_id(self.slave_id, now):
+					self.send(max(now, self.tx_free), 0x80 | self.slave_id)
+		elif (self.rnw == 0):
+			slave = self.slave(self.slave_id)
+			if (slave is self.pat_gen):
+				slave.write(self.address & 0xFF, data, now)
+			elif (slave is self.bram) and self.pat_gen.pattern_active(now):
+				slave.write(self.pat_gen.ram_address(now), data) # bram_address is ram_addr_pat_gen while the pattern is active
+			elif (slave is not None):
+				slave.write(self.address, data)
+			self.address = (self.address + 1) & ((1 << (8 * self.num_addr_bytes)) - 1)
+		else:
+			self.start_read(data & 0x3F, now)
+
+	# the slave_id echo repeats while the fpga waits for the length byte, then the read data follows.
+	# rx bytes are ignored until the final read byte has started to be sent. When nothing is sent (invalid slave_id or
+	# an active pattern) tx_bsy stays low and the read count runs through in a few clocks
+	def start_read(self, num_read_bytes, now):
+		self.num_read_bytes = num_read_bytes
+		self.count = self.num_addr_bytes + 2
+		if (num_read_bytes == 0):
+			return # only a block timeout returns count to zero
+		send_enable = self.valid_slave_id(self.slave_id, now)
+		while send_enable and (self.tx_free < now - 1.0E-9):
+			self.send(self.tx_free, 0x80 | self.slave_id)
+		start_time = max(now, self.tx_free) if send_enable else now
+		slave = self.slave(self.slave_id)
+		for index in range(num_read_bytes):
+			if send_enable:
+				self.send(start_time, slave.read(self.address) if (slave is not None) else 0)
+				self.read_done = start_time
+				start_time += self.char_time(1)
+			else:
+				self.read_done = now
+			self.address = (self.address + 1) & ((1 << (8 * self.num_addr_bytes)) - 1)
+
+	def write(self, data):
+		with self.lock:
+			now = time.perf_counter()
+			stop_time = max(now, self.line_free)
+			for byte in bytes(data):
+				stop_time += self.char_time(1)
+				if (self.count > self.num_addr_bytes + 1) and (self.num_read_bytes != 0) and (stop_time >= self.read_done):
+					self.count = 0
+					self.num_read_bytes = 0
+				self.receive_byte(byte, stop_time)
+			self.lock.notify_all()
+		return len(data)
+
+	def ready_bytes(self, now):
+		ready = 0
+		while (ready < len(self.tx_queue)) and (self.tx_queue[ready][0] <= now):
+			ready += 1
+		return ready
+
+	# blocks until "size" bytes have been sent by the fpga or self.timeout expires
+	def read(self, size=1):
+		with self.lock:
+			deadline = time.perf_counter() + (self.timeout if (self.timeout is not None) else 1.0E9)
+			while True:
+				now = time.perf_counter()
+				ready = self.ready_bytes(now)
+				if (ready >= size) or (now >= deadline):
+					break
+				if (ready < len(self.tx_queue)):
+					wait_time = min(self.tx_queue[min(size, len(self.tx_queue)) - 1][0], deadline) - now
+				else:
+					wait_time = deadline - now # a write from another thread wakes this up
+				self.lock.wait(max(wait_time, 0.0))
+			ready = min(ready, size)
+			data = bytes([byte for (ready_time, byte) in self.tx_queue[:ready]])
+			del self.tx_queue[:ready]
+			return data
+
+	@property
+	def in_waiting(self):
+		with self.lock:
+			return self.ready_bytes(time.perf_counter())
+
+	# bytes written by the host that are not on the wire yet
+	@property
+	def out_waiting(self):
+		with self.lock:
+			return max(int((self.line_free - time.perf_counter()) / self.char_time(1) + 0.999), 0)
+
+	def flush(self):
+		with self.lock:
+			wait_time = self.line_free - time.perf_counter()
+		if (wait_time > 0):
+			time.sleep(wait_time)
+
+	def reset_input_buffer(self):
+		with self.lock:
+			self.tx_queue = []
+
+	def reset_output_buffer(self):
+		pass
+
+	def close(self):
+		self.is_open = False
@@ -0,0 +1,100 @@
+import bisect
+import csv
+import io
+import json
+import threading
+
+# Frame counters for scarf_uart_slave, pass one object to any number of slaves with metrics=...
+# Every frame sent by a slave is recorded under its (slave_id, operation), the operations are 'write', 'read', 'read_id'
+# and 'batch_receive' (the single response read of a scarf_uart_batch). Reads queued in a batch are 'read' frames with
+# no received bytes, their response bytes are counted by 'batch_receive'. Times are in seconds:
+#   wire_time   time the frame and response bytes need on the uart at the port baudrate
+#   wait_time   time blocked in port.write/flush/read, waiting for the os, the usb-serial chip and the fpga
+#   sleep_time  time in time.sleep, the idle gaps that framing needs
+#   total_time  time from the start of the frame until the slave is ready for the next one
+# short_reads counts responses that ended with fewer bytes than expected, because the read deadline passed (lost or
+# missing read data). The latency histogram is of total_time.
+#
+#   metrics = scarf_uart_metrics()
+#   bram = scarf_uart_slave(slave_id=0x03, metrics=metrics)
+#   ...
+#   metrics.to_csv('uart_metrics.csv')
+
+class scarf_uart_metrics:
+
+	# upper bounds (seconds) of the latency histogram buckets, the final bucket counts everything slower
+	histogram_bounds = [0.0001, 0.0002, 0.0005, 0.001, 0.002, 0.005, 0.01, 0.02, 0.05, 0.1, 0.2, 0.5, 1.0]
+
+	fields = ['frames', 'bytes_sent', 'bytes_received', 'wire_time', 'wait_time', 'sleep_time', 'total_time', 'short_reads']
+
+	# Constructor, "callback" is called with a dict of every recorded frame, see add_callback()
+	def __init__(self, callback=None):
+		self.lock      = threading.Lock()
+		self.callbacks = [] if (callback is None) else [callback]
+		self.counters  = {} # (slave_id, operation) -> dict of fields and 'histogram'
+
+	# "callback" is called after each frame with a dict of slave_id, operation and the fields of that frame.
+	# It runs in the thread that sent the frame while the port lock is held, so it should be quick
+	def add_callback(self, callback):
+		self.callbacks.append(callback)
+
+	def remove_callback(self, callback):
+		self.callbacks.remove(callback)
+
+	def reset(self):
+		with self.lock:
+			self.counters = {}
+
+	def record(self, slave_id, operation, frames=1, bytes_sent=0, bytes_received=0, wire_time=0.0, wait_time=0.0, sleep_time=0.0, total_time=0.0, short_reads=0):
+		values = [frames, bytes_sent, bytes_received, wire_time, wait_time, sleep_time, total_time, short_reads]
+		with self.lock:
+			key = (slave_id, operation)
+			if key not in self.counters:
+				self.counters[key] = dict.fromkeys(self.fields, 0)
+				self.counters[key]['histogram'] = [0] * (len(self.histogram_bounds) + 1)
+			counter = self.counters[key]
+			for (field, value) in zip(self.fields, values):
+				counter[field] += value
+			counter['histogram'][bisect.bisect_left(self.histogram_bounds, total_time)] += 1
+		if (len(self.callbacks) > 0):
+			frame_record = dict(zip(self.fields, values))
+			frame_record['slave_id']  = slave_id
+			frame_record['operation'] = operation
+			for callback in self.callbacks:
+				callback(frame_record)
+
+	# a list with one dict per (slave_id, operation), sorted by slave_id and operation
+	def summary(self):
+		with self.lock:
+			rows = []
+			for (slave_id, operation) in sorted(self.counters, key=lambda key: (str(key[0]), key[1])):
+				row = {'slave_id': slave_id, 'operation': operation}
+				row.update(self.counters[(slave_id, operation)])
+				row['histogram'] = list(row['histogram'])
+				rows.append(row)
+			return rows
+
+	# histogram bucket names, "le_100us" counts frames up to 100us and "gt_1000ms" the ones slower than every bound
+	def histogram_names(self):
+		names = ["le_{:.0f}us".format(bound * 1.0E6) if (bound < 0.001) else "le_{:.0f}ms".format(bound * 1000.0) for bound in self.histogram_bounds]
+		return names + ["gt_{:.0f}ms".format(self.histogram_bounds[-1] * 1000.0)]
+
+	# the summary as a json string, also written to "path" when given
+	def to_json(self, path=None):
+		text = json.dumps({'histogram_bounds': self.histogram_bounds, 'counters': self.summary()}, indent=2)
+		if (path is not None):
+			with open(path, 'w') as json_file:
+				json_file.write(text)
+		return text
+
+	# the summary as csv with one row per (slave_id, operation) and one column per histogram bucket, also written to "path" when given
+	def to_csv(self, path=None):
+		output = io.StringIO()
+		writer = csv.writer(output, lineterminator='\n')
+		writer.writerow(['slave_id', 'operation'] + self.fields + self.histogram_names())
+		for row in self.summary():
+			writer.writerow([row['slave_id'], row['operation']] + [row[field] for field in self.fields] + row['histogram'])
+		if (path is not None):
+			with open(path, 'w') as csv_file:
+				csv_file.write(output.getvalue())
+		return output.getvalue()
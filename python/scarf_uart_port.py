@@ -0,0 +1,81 @@
+import serial
+import threading
+
+# One shared serial handle per device path, opened on first use instead of when a module is imported.
+# scarf_uart_slave and scarf_uart_batch hold self.lock while they send a frame (and read its response),
+# so several threads can drive different slave_ids on one board without interleaving bytes.
+# The lock is re-entrant, a batch holds it for the whole transaction while each frame takes it again.
+class scarf_uart_port:
+
+	registry      = {} # device path (or id of an already opened serial object) -> scarf_uart_port
+	registry_lock = threading.Lock()
+
+	# Constructor, use scarf_uart_port.get() so that the handle is shared
+	def __init__(self, device='/dev/ttyUSB1', baudrate=1000000, timeout=0.001, serial_port=None):
+		self.device      = device
+		self.baudrate    = baudrate
+		self.timeout     = timeout
+		self.serial_port = serial_port
+		self.lock        = threading.RLock()
+
+	# return the shared port for "port", which can be a device path, an already opened serial object or a scarf_uart_port
+	@classmethod
+	def get(cls, port='/dev/ttyUSB1', baudrate=1000000, timeout=0.001):
+		if isinstance(port, cls):
+			return port
+		if isinstance(port, str):
+			device      = port
+			serial_port = None
+		else:
+			device      = getattr(port, 'port', None) or id(port)
+			serial_port = port
+			baudrate    = port.baudrate
+		with cls.registry_lock:
+			if device not in cls.registry:
+				cls.registry[device] = cls(device=device, baudrate=baudrate, timeout=timeout, serial_port=serial_port)
+			elif (serial_port is not None) and (cls.registry[device].serial_port is None):
+				cls.registry[device].serial_port = serial_port
+			return cls.registry[device]
+
+	# open the device if this is the first use, the handle is kept open until close()
+	def open(self):
+		with self.lock:
+			if (self.serial_port is None):
+				self.serial_port = serial.Serial(port=self.device, baudrate=self.baudrate, bytesize=8, parity='N', stopbits=1, timeout=self.timeout)
+			return self.serial_port
+
+	# the next use opens the device again
+	def close(self):
+		with self.lock:
+			if (self.serial_port is not None):
+				self.serial_port.close()
+				self.serial_port = None
+
+	def __enter__(self):
+		return self
+
+	def __exit__(self, exc_type, exc_value, traceback):
+		self.close()
+
+	def write(self, data):
+		return self.open().write(data)
+
+	def read(self, size=1):
+		return self.open().read(size)
+
+	def flush(self):
+		self.open().flush()
+
+	def reset_input_buffer(self):
+		self.open().reset_input_buffer()
+
+	def reset_output_buffer(self):
+		self.open().reset_output_buffer()
+
+	@property
+	def in_waiting(self):
+		return self.open().in_waiting
+
+	@property
+	def out_waiting(self):
+		return self.open().out_waiting
@@ -1,17 +1,228 @@
-import serial
 import time
+from scarf_uart_port import scarf_uart_port
 
 class scarf_uart_slave:
-	
+
 	# Constructor
-	def __init__(self, slave_id=0x00, num_addr_bytes=1, port=serial.Serial(port='/dev/ttyUSB1', baudrate=1000000, bytesize=8, parity='N', stopbits=1, timeout=0.001), debug=False):
+	# port can be a device path, an opened serial object or a scarf_uart_port, slaves on the same device share one handle
+	# framing='protocol' only waits as long as the uart traffic needs, framing='sleep' is the original fixed 100ms delay per frame
+	# usb_latency is the worst case usb-serial turnaround (ftdi latency timer is 16ms by default), it is added to the read deadline
+	# shadow_size > 0 keeps a write-through copy of addresses 0 to shadow_size-1, only changed bytes are written and reads of known
+	# bytes skip the uart. volatile_addrs are always written and always read from the fpga (for example an enable edge register).
+	# Unchanged bytes between two changed ones are re-written instead of starting a new frame when there are no more than coalesce_gap
+	# of them, the default is the wire time break-even of a new frame (slave_id, address bytes and the block timeout gap)
+	# metrics is an optional scarf_uart_metrics that records every frame, it can be shared by several slaves
+	def __init__(self, slave_id=0x00, num_addr_bytes=1, port='/dev/ttyUSB1', debug=False, framing='protocol', usb_latency=0.02, shadow_size=0, volatile_addrs=[], coalesce_gap=None, metrics=None):
 		self.slave_id         = slave_id
 		self.num_addr_bytes   = num_addr_bytes
-		self.port             = port
+		self.port             = scarf_uart_port.get(port)
 		self.read_buffer_max  = 60 - self.num_addr_bytes # this is a tang_nano limitation
 		self.write_buffer_max = 60 - self.num_addr_bytes # this is a tang_nano limitation
 		self.debug            = debug
-		
+		self.framing          = framing
+		self.usb_latency      = usb_latency
+		self.shadow           = [None] * shadow_size # None is an unknown value
+		self.volatile_addrs   = set(volatile_addrs)
+		self.coalesce_gap     = (2 + self.num_addr_bytes) if (coalesce_gap is None) else coalesce_gap
+		self.metrics          = metrics
+		self.short_reads      = 0 # 1 if the last response ended with fewer bytes than expected, the read deadline passed
+		self.frame_buffer     = bytearray(1 + self.num_addr_bytes + self.write_buffer_max) # reused by every read_bytes/write_bytes frame
+
+	# time in seconds to send "num_bytes" uart frames (start bit, 8 data bits and stop bit) at the port baudrate
+	def frame_time(self, num_bytes=1):
+		return num_bytes * 10.0 / self.port.baudrate
+
+	# uart_rx.sv signals the end of a block after the line is idle for 5.5 bit periods (BIT4AT), a full frame of idle gives margin
+	def block_timeout_time(self):
+		return self.frame_time(1)
+
+	# send one frame and hold off until the fpga is ready for the next one. For a write that is the block timeout,
+	# for a read queued without waiting for its response that is the time the fpga needs to send "response_bytes"
+	def send_frame(self, frame, response_bytes=0):
+		with self.port.lock:
+			start_time = time.perf_counter()
+			self.port.write(frame)
+			if (self.framing == 'sleep'):
+				sent_time = time.perf_counter()
+				time.sleep(0.1)
+			else:
+				self.port.flush() # wait for the os to drain the bytes to the usb-serial chip
+				sent_time = time.perf_counter()
+				idle_time = max(start_time + self.frame_time(len(frame) + response_bytes), sent_time) + self.block_timeout_time() - time.perf_counter()
+				if (idle_time > 0):
+					time.sleep(idle_time)
+			if (self.metrics is not None):
+				end_time = time.perf_counter()
+				self.metrics.record(self.slave_id, 'write' if (response_bytes == 0) else 'read', bytes_sent=len(frame), wire_time=self.frame_time(len(frame) + response_bytes),
+				                    wait_time=sent_time - start_time, sleep_time=end_time - sent_time, total_time=end_time - start_time)
+
+	# send one read frame and return the raw response, which is slave_id echo bytes followed by "step_size" read bytes.
+	# The fpga sends the slave_id echo while it waits for the read length byte. When the frame bytes arrive back-to-back
+	# only one echo is sent, a gap before the length byte can add more echoes (up to num_addr_bytes extra).
+	def read_response(self, frame, step_size, operation='read'):
+		max_bytes = 1 + self.num_addr_bytes + step_size
+		with self.port.lock:
+			start_time = time.perf_counter()
+			sleep_time = 0.0
+			self.port.reset_input_buffer() # a byte left over from an earlier response would be taken as read data
+			self.port.write(frame)
+			if (self.framing == 'sleep'):
+				time.sleep(0.1)
+				sleep_time = time.perf_counter() - start_time
+				response = bytearray(self.port.read(max_bytes))
+				self.short_reads = 1 if (len(response) < 1 + step_size) else 0
+			else:
+				response = self.receive(1 + step_size, max_bytes, self.frame_time(len(frame) + max_bytes) + self.usb_latency)
+			if (self.metrics is not None):
+				total_time = time.perf_counter() - start_time
+				self.metrics.record(self.slave_id, operation, bytes_sent=len(frame), bytes_received=len(response), wire_time=self.frame_time(len(frame) + len(response)),
+				                    wait_time=total_time - sleep_time, sleep_time=sleep_time, total_time=total_time, short_reads=self.short_reads)
+			return response
+
+	# read at least "min_bytes" before "wait_time" expires, then keep reading until "max_bytes" have arrived or no byte has
+	# arrived for "idle_time". Extra slave_id echoes push the final read bytes back, so they can still be on the wire once
+	# "min_bytes" have arrived. The default idle_time is the time of the num_addr_bytes extra echoes plus one byte of margin
+	def receive(self, min_bytes, max_bytes, wait_time, idle_time=None):
+		if (idle_time is None):
+			idle_time = self.frame_time(self.num_addr_bytes + 1)
+		deadline = time.perf_counter() + wait_time
+		response = bytearray()
+		while (len(response) < min_bytes) and (time.perf_counter() < deadline):
+			response.extend(self.port.read(min_bytes - len(response)))
+		idle_deadline = time.perf_counter() + idle_time
+		while (len(response) < max_bytes):
+			extra_bytes = min(self.port.in_waiting, max_bytes - len(response))
+			if (extra_bytes > 0):
+				response.extend(self.port.read(extra_bytes))
+				idle_deadline = time.perf_counter() + idle_time
+			elif (len(response) < min_bytes) or (time.perf_counter() >= idle_deadline):
+				break
+		self.short_reads = 1 if (len(response) < min_bytes) else 0
+		return response
+
+	# the read data is always the final "step_size" bytes of the response
+	def send_read_frame(self, frame, step_size):
+		response = self.read_response(frame, step_size)
+		if (len(response) < step_size + 1):
+			print("Error: expected {:d} response bytes from slave_id 0x{:02x}, received {:d}".format(step_size + 1,self.slave_id,len(response)))
+			return list(response[1:])
+		return list(response[-step_size:])
+
+	def addr_byte_list(self, address):
+		addr_byte_list = []
+		for addr_byte_num in range(self.num_addr_bytes):
+			addr_byte_list.insert(0, address >> (8*addr_byte_num) & 0xFF )
+		return addr_byte_list
+
+	# split a read of "num_bytes" into frames of at most self.read_buffer_max, returns a list of (frame, step_size)
+	def read_frames(self, addr=0x00, num_bytes=1):
+		byte0 = (self.slave_id + 0x80) & 0xFF
+		frames = []
+		for address in range(addr, addr + num_bytes, self.read_buffer_max):
+			step_size = min(self.read_buffer_max, addr + num_bytes - address)
+			frames.append((bytearray([byte0] + self.addr_byte_list(address) + [step_size]), step_size))
+		return frames
+
+	# split "write_byte_list" into frames of at most self.write_buffer_max, returns a list of (frame, step_size)
+	def write_frames(self, addr=0x00, write_byte_list=[]):
+		byte0 = self.slave_id & 0xFF
+		frames = []
+		for address in range(addr, addr + len(write_byte_list), self.write_buffer_max):
+			step_size = min(self.write_buffer_max, addr + len(write_byte_list) - address)
+			frames.append((bytearray([byte0] + self.addr_byte_list(address) + list(write_byte_list[address-addr:address-addr+step_size])), step_size))
+		return frames
+
+	# the first 1 + num_addr_bytes + "num_data_bytes" bytes of self.frame_buffer as a memoryview, with byte0 and the address filled in.
+	# The buffer is shared by every frame of this slave, so only use it while holding the port lock
+	def frame_header(self, byte0, address, num_data_bytes):
+		frame_length = 1 + self.num_addr_bytes + num_data_bytes
+		if (len(self.frame_buffer) < frame_length):
+			self.frame_buffer = bytearray(frame_length) # read_buffer_max or write_buffer_max was raised
+		self.frame_buffer[0] = byte0
+		for addr_byte_num in range(self.num_addr_bytes):
+			self.frame_buffer[self.num_addr_bytes - addr_byte_num] = address >> (8*addr_byte_num) & 0xFF
+		return memoryview(self.frame_buffer)[:frame_length]
+
+	# write every byte of "data" (a byte memoryview), the shadow is not checked
+	def send_bytes(self, addr, data):
+		with self.port.lock:
+			for offset in range(0, len(data), self.write_buffer_max):
+				step_size = min(self.write_buffer_max, len(data) - offset)
+				frame = self.frame_header(self.slave_id & 0xFF, addr + offset, step_size)
+				frame[1 + self.num_addr_bytes:] = data[offset:offset + step_size]
+				self.send_frame(frame)
+
+	# read len("out") bytes from the fpga straight into "out" (a writable byte memoryview), the shadow is not checked.
+	# Returns False if a response was short, the missing bytes are left as they were
+	def receive_bytes(self, addr, out):
+		complete = True
+		with self.port.lock:
+			for offset in range(0, len(out), self.read_buffer_max):
+				step_size = min(self.read_buffer_max, len(out) - offset)
+				frame = self.frame_header((self.slave_id + 0x80) & 0xFF, addr + offset, 1)
+				frame[-1] = step_size
+				response = self.read_response(frame, step_size)
+				if (len(response) < step_size + 1):
+					print("Error: expected {:d} response bytes from slave_id 0x{:02x}, received {:d}".format(step_size + 1,self.slave_id,len(response)))
+					num_received = max(len(response) - 1, 0)
+					out[offset:offset + num_received] = response[1:1 + num_received]
+					complete = False
+				else:
+					out[offset:offset + step_size] = memoryview(response)[-step_size:]
+		return complete
+
+	# return True if every byte of the read is known in the shadow
+	def shadow_valid(self, addr, num_bytes):
+		if (addr < 0) or (addr + num_bytes > len(self.shadow)):
+			return False
+		for address in range(addr, addr + num_bytes):
+			if (self.shadow[address] is None) or (address in self.volatile_addrs):
+				return False
+		return True
+
+	# store bytes that were written to or read from the fpga, addresses outside the shadow are ignored
+	def update_shadow(self, addr, byte_list):
+		for (offset, data) in enumerate(byte_list):
+			if (0 <= addr + offset < len(self.shadow)):
+				self.shadow[addr + offset] = data
+
+	# forget every shadow value, use after the board is reset or reprogrammed
+	def invalidate_shadow(self):
+		self.shadow = [None] * len(self.shadow)
+
+	# reload the whole shadow from the fpga
+	def sync_shadow(self):
+		self.invalidate_shadow()
+		if (len(self.shadow) > 0):
+			self.read_list(addr=0x00, num_bytes=len(self.shadow))
+
+	# like write_frames, but only the bytes that differ from the shadow (or are volatile) are written.
+	# Changed bytes are merged into the fewest contiguous-address frames, see coalesce_gap.
+	# "pending" is a dict of address -> value of writes that are queued but not sent yet, they are compared instead of the shadow.
+	# The shadow is not changed, call update_shadow once the frames have been sent
+	def dirty_write_frames(self, addr=0x00, write_byte_list=[], pending=None):
+		if (len(self.shadow) == 0):
+			return self.write_frames(addr, write_byte_list)
+		frames = []
+		run_start = None
+		run_end   = None
+		for (offset, data) in enumerate(write_byte_list):
+			address = addr + offset
+			if (pending is not None) and (address in pending) and (address not in self.volatile_addrs):
+				if (pending[address] == data):
+					continue
+			elif self.shadow_valid(address, 1) and (self.shadow[address] == data):
+				continue
+			if (run_start is not None) and (address - run_end > self.coalesce_gap):
+				frames.extend(self.write_frames(run_start, write_byte_list[run_start-addr:run_end-addr]))
+				run_start = None
+			if (run_start is None):
+				run_start = address
+			run_end = address + 1
+		if (run_start is not None):
+			frames.extend(self.write_frames(run_start, write_byte_list[run_start-addr:run_end-addr]))
+		return frames
+
 	# this routine allows "num_bytes" to be larger than the self.read_buffer_max
 	def read_list(self, addr=0x00, num_bytes=1):
 		if (self.debug == True):
@@ -19,51 +230,31 @@ class scarf_uart_slave:
 		if (num_bytes == 0):
 			print("Error: num_bytes must be larger than zero")
 			return []
+		elif self.shadow_valid(addr, num_bytes):
+			read_list = self.shadow[addr:addr + num_bytes]
 		else:
-			byte0 = (self.slave_id + 0x80) & 0xFF
-			remaining_bytes = num_bytes
 			read_list = []
-			address = addr - self.read_buffer_max # expecting to add self.read_buffer_max
-			while (remaining_bytes > 0):
-				if (remaining_bytes >= self.read_buffer_max):
-					step_size = self.read_buffer_max
-					remaining_bytes = remaining_bytes - self.read_buffer_max
-				else:
-					step_size = remaining_bytes
-					remaining_bytes = 0
-				address = address + self.read_buffer_max
-				addr_byte_list = []
-				for addr_byte_num in range(self.num_addr_bytes):
-					addr_byte_list.insert(0, address >> (8*addr_byte_num) & 0xFF )
-				self.port.write(bytearray([byte0] + addr_byte_list + [step_size]))
-				time.sleep(0.1)
-				tmp_read_list = list(self.port.read(step_size + self.num_addr_bytes + 1))
-				read_list.extend(tmp_read_list[-step_size:])
-			if (self.debug == True):
-				address = addr
-				for read_byte in read_list:
-					print("Address 0x{:02x} Read data 0x{:02x}".format(address,read_byte))
-					address += 1
-			return read_list
-	
+			for (frame, step_size) in self.read_frames(addr, num_bytes):
+				read_list.extend(self.send_read_frame(frame, step_size))
+			if (len(read_list) == num_bytes):
+				self.update_shadow(addr, read_list)
+		if (self.debug == True):
+			address = addr
+			for read_byte in read_list:
+				print("Address 0x{:02x} Read data 0x{:02x}".format(address,read_byte))
+				address += 1
+		return read_list
+
 	# this routine allows "write_byte_list" to be larger than the self.write_buffer_max
+	# The shadow is updated after the frames are sent, if a send fails the range is marked as unknown
 	def write_list(self, addr=0x00, write_byte_list=[]):
-		byte0 = self.slave_id & 0xFF
-		remaining_bytes = len(write_byte_list)
-		address = addr - self.write_buffer_max # expecting to add self.write_buffer_max
-		while (remaining_bytes > 0):
-			if (remaining_bytes >= self.write_buffer_max):
-				step_size = self.write_buffer_max
-				remaining_bytes = remaining_bytes - self.write_buffer_max
-			else:
-				step_size = remaining_bytes
-				remaining_bytes = 0
-			address = address + self.write_buffer_max
-			addr_byte_list = []
-			for addr_byte_num in range(self.num_addr_bytes):
-				addr_byte_list.insert(0, address >> (8*addr_byte_num) & 0xFF )
-			self.port.write(bytearray([byte0] + addr_byte_list + write_byte_list[address-addr:address+step_size]))
-			time.sleep(0.1)
+		try:
+			for (frame, step_size) in self.dirty_write_frames(addr, write_byte_list):
+				self.send_frame(frame)
+		except BaseException:
+			self.update_shadow(addr, [None] * len(write_byte_list))
+			raise
+		self.update_shadow(addr, write_byte_list)
 		if (self.debug == True):
 			print("Called write_bytes")
 			address = addr
@@ -71,16 +262,107 @@ class scarf_uart_slave:
 				print("Wrote address 0x{:02x} data 0x{:02x}".format(address,write_byte))
 				address += 1
 		return 1
-	
+
+	# "buffer" as a flat byte memoryview, or None after an error print. Only contiguous buffers of 1 byte items are taken
+	# (bytes, bytearray, memoryview or a numpy uint8 array), a wider dtype would be sent or filled as itemsize times as many bytes
+	def byte_view(self, buffer, writable=False):
+		view = memoryview(buffer)
+		if (view.itemsize != 1):
+			print("Error: expected a buffer of bytes (numpy uint8), its items are {:d} bytes".format(view.itemsize))
+			return None
+		if not view.c_contiguous:
+			print("Error: the buffer is not contiguous, pass a copy (numpy.ascontiguousarray)")
+			return None
+		if writable and view.readonly:
+			print("Error: the buffer is read-only")
+			return None
+		return view.cast('B')
+
+	# same as write_list for any bytes-like "data" (bytes, bytearray, memoryview or a numpy uint8 array), without building lists.
+	# Every frame is assembled in self.frame_buffer. When the slave has a shadow the write goes through write_list, so only changed bytes are sent.
+	# Returns None if "data" is not a byte buffer
+	def write_bytes(self, addr=0x00, data=b''):
+		data = self.byte_view(data)
+		if (data is None):
+			return None
+		if (len(self.shadow) > 0):
+			return self.write_list(addr, data)
+		self.send_bytes(addr, data)
+		if (self.debug == True):
+			print("Called write_bytes, wrote {:d} bytes from address 0x{:02x}".format(len(data),addr))
+		return 1
+
+	# same as read_list but the data is copied once, from each response into "out" (any writable bytes-like object of at least
+	# "num_bytes", for example a numpy uint8 array). A new bytearray is used when "out" is None. Returns "out", which is not
+	# changed if it is not a writable byte buffer
+	def read_bytes(self, addr=0x00, num_bytes=1, out=None):
+		if (out is None):
+			out = bytearray(num_bytes)
+		if (num_bytes == 0):
+			print("Error: num_bytes must be larger than zero")
+			return out
+		view = self.byte_view(out, writable=True)
+		if (view is None):
+			return out
+		view = view[:num_bytes]
+		if (len(view) < num_bytes):
+			print("Error: out holds {:d} bytes, {:d} were requested".format(len(view),num_bytes))
+			return out
+		if self.shadow_valid(addr, num_bytes):
+			view[:] = bytes(self.shadow[addr:addr + num_bytes])
+		elif self.receive_bytes(addr, view) and (len(self.shadow) > 0):
+			self.update_shadow(addr, view)
+		if (self.debug == True):
+			print("Called read_bytes, read {:d} bytes from address 0x{:02x}".format(num_bytes,addr))
+		return out
+
+	# write_bytes followed by a read back that bypasses the shadow. The read back is compared in write_buffer_max chunks
+	# (whole-chunk buffer compares, no per-byte python loop) and only the chunks that differ are written and read again,
+	# up to "retries" times. Returns the addresses that still do not match, an empty list when the write was verified.
+	# A chunk whose read back was short counts as a mismatch. Returns None if "data" is not a byte buffer
+	def write_bytes_verified(self, addr=0x00, data=b'', retries=3):
+		data = self.byte_view(data)
+		if (data is None):
+			return None
+		self.write_bytes(addr, data)
+		read_back = memoryview(bytearray(len(data)))
+		chunks = self.verify_chunks(len(data))
+		for attempt in range(retries + 1):
+			if (attempt > 0):
+				for (start, end, complete) in chunks:
+					self.send_bytes(addr + start, data[start:end])
+			chunks = [(start, end, self.receive_bytes(addr + start, read_back[start:end])) for (start, end, complete) in chunks]
+			chunks = self.failed_chunks(data, read_back, chunks)
+			if (len(chunks) == 0):
+				return []
+		return self.unverified_addresses(addr, data, read_back, chunks, retries)
+
+	# (start, end, complete) offsets of the write_buffer_max chunks of a verified write of "num_bytes"
+	def verify_chunks(self, num_bytes):
+		return [(offset, min(offset + self.write_buffer_max, num_bytes), False) for offset in range(0, num_bytes, self.write_buffer_max)]
+
+	# the chunks that were read back short or differ from "data", a short read back is never compared as it is partly stale
+	def failed_chunks(self, data, read_back, chunks):
+		return [(start, end, complete) for (start, end, complete) in chunks if (not complete) or (read_back[start:end] != data[start:end])]
+
+	# the addresses of the failed chunks that did not verify (every address of a short chunk), they are marked unknown in the shadow
+	def unverified_addresses(self, addr, data, read_back, chunks, retries):
+		mismatches = []
+		for (start, end, complete) in chunks:
+			mismatches.extend([addr + offset for offset in range(start, end) if (not complete) or (read_back[offset] != data[offset])])
+		for address in mismatches:
+			self.update_shadow(address, [None])
+		print("Error: {:d} bytes from slave_id 0x{:02x} did not verify after {:d} retries".format(len(mismatches),self.slave_id,retries))
+		return mismatches
+
 	# Two bytes are returned, when a read of 1 byte is specified. An echo of the slave_id and RNW bit, and the actual read byte
 	# The slave_id is kept and the actual read is ignored. The most significant bit is the RNW, and this is removed to just return the slave_id
 	def read_id(self):
-		self.port.reset_input_buffer()
-		self.port.reset_output_buffer()
 		byte0 = (self.slave_id + 0x80)
-		self.port.write(bytearray([byte0] + [0x00, 0x01]))
-		time.sleep(0.1)
-		slave_id_list = list(self.port.read(2))
+		with self.port.lock:
+			self.port.reset_input_buffer()
+			self.port.reset_output_buffer()
+			slave_id_list = list(self.read_response(bytearray([byte0] + [0x00, 0x01]), 1, operation='read_id'))
 		slave_id = slave_id_list[0] - 0x80
 		if (self.debug == True):
 			print("Slave ID is 0x{:02x}".format(slave_id))
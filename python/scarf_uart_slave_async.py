@@ -0,0 +1,338 @@
+import asyncio
+import collections
+import time
+import weakref
+from scarf_uart_slave import scarf_uart_slave
+
+# asyncio counterpart of scarf_uart_slave, read_list, write_list, read_bytes, write_bytes, write_bytes_verified and read_id
+# are awaitable and never block the event loop.
+# Frames, chunking (read_buffer_max/write_buffer_max), framing, the shadow and the error prints are the same as the sync class.
+# Each request can have a timeout and can be cancelled, the frames it has not sent yet are dropped.
+# Requests on one port go through a queue and run one at a time, so one event loop can keep many boards busy:
+#
+#   boards = [scarf_uart_slave_async(slave_id=0x03, port=device) for device in ['/dev/ttyUSB1', '/dev/ttyUSB3']]
+#   await asyncio.gather(*[bram.write_list(addr=0x00, write_byte_list=pattern) for bram in boards])
+
+# one request queue per scarf_uart_port and event loop
+class scarf_uart_async_port:
+
+	ports = weakref.WeakKeyDictionary() # event loop -> {scarf_uart_port: scarf_uart_async_port}, dropped with the loop
+
+	@classmethod
+	def get(cls, port):
+		loop = asyncio.get_running_loop()
+		if loop not in cls.ports:
+			cls.ports[loop] = {}
+		if port not in cls.ports[loop]:
+			cls.ports[loop][port] = cls(port)
+		return cls.ports[loop][port]
+
+	# Constructor, use scarf_uart_async_port.get() so that the queue is shared
+	def __init__(self, port):
+		self.port     = port
+		self.requests = collections.deque() # (request, future)
+		self.worker   = None
+
+	# "request" is an async function that is passed its future, it should stop sending frames once the future is cancelled
+	async def submit(self, request, timeout=None):
+		future = asyncio.get_running_loop().create_future()
+		self.requests.append((request, future))
+		if (self.worker is None) or self.worker.done():
+			self.worker = asyncio.get_running_loop().create_task(self.run())
+		if (timeout is None):
+			return await future
+		return await asyncio.wait_for(future, timeout)
+
+	# the worker task, if it is cancelled (for example when the loop shuts down) the waiting requests are cancelled too
+	async def run(self):
+		future = None
+		try:
+			while (len(self.requests) > 0):
+				(request, future) = self.requests.popleft()
+				if future.done():
+					continue # cancelled or timed out before it started
+				# the port lock is shared with threads using the sync classes, it can not be waited on without blocking the loop
+				while not self.port.lock.acquire(blocking=False):
+					await asyncio.sleep(0.001)
+				try:
+					result = await request(future)
+					if not future.done():
+						future.set_result(result)
+				except Exception as exception:
+					if not future.done():
+						future.set_exception(exception)
+				finally:
+					self.port.lock.release()
+		finally:
+			self.worker = None
+			if (future is not None) and not future.done():
+				future.cancel()
+			while (len(self.requests) > 0):
+				self.requests.popleft()[1].cancel()
+
+class scarf_uart_slave_async(scarf_uart_slave):
+
+	# Constructor, request_timeout (seconds) is the default timeout of every request, None waits forever
+	def __init__(self, slave_id=0x00, num_addr_bytes=1, port='/dev/ttyUSB1', debug=False, framing='protocol', usb_latency=0.02, shadow_size=0, volatile_addrs=[], coalesce_gap=None, metrics=None, request_timeout=None):
+		scarf_uart_slave.__init__(self, slave_id=slave_id, num_addr_bytes=num_addr_bytes, port=port, debug=debug, framing=framing, usb_latency=usb_latency,
+		                          shadow_size=shadow_size, volatile_addrs=volatile_addrs, coalesce_gap=coalesce_gap, metrics=metrics)
+		self.request_timeout = request_timeout
+
+	def submit(self, request, timeout):
+		return scarf_uart_async_port.get(self.port).submit(request, self.request_timeout if (timeout is None) else timeout)
+
+	# non-blocking port.flush(), wait until the bytes have left the os and usb-serial buffers
+	async def drain(self):
+		out_waiting = self.port.out_waiting
+		while (out_waiting > 0):
+			await asyncio.sleep(self.frame_time(out_waiting))
+			out_waiting = self.port.out_waiting
+
+	# wait until the port has bytes to read or "wait_time" expires
+	async def readable(self, wait_time):
+		serial_port = self.port.open()
+		if not hasattr(serial_port, 'fileno'):
+			await asyncio.sleep(min(wait_time, 0.0005)) # no file descriptor to wait on, poll
+			return
+		loop = asyncio.get_running_loop()
+		ready = loop.create_future()
+		loop.add_reader(serial_port.fileno(), lambda: ready.done() or ready.set_result(None))
+		try:
+			await asyncio.wait_for(ready, wait_time)
+		except asyncio.TimeoutError:
+			pass
+		finally:
+			loop.remove_reader(serial_port.fileno())
+
+	# same as scarf_uart_slave.send_frame
+	async def send_frame_async(self, frame, response_bytes=0):
+		start_time = time.perf_counter()
+		self.port.write(frame)
+		if (self.framing == 'sleep'):
+			sent_time = time.perf_counter()
+			await asyncio.sleep(0.1)
+		else:
+			await self.drain()
+			sent_time = time.perf_counter()
+			idle_time = max(start_time + self.frame_time(len(frame) + response_bytes), sent_time) + self.block_timeout_time() - time.perf_counter()
+			if (idle_time > 0):
+				await asyncio.sleep(idle_time)
+		if (self.metrics is not None):
+			end_time = time.perf_counter()
+			self.metrics.record(self.slave_id, 'write' if (response_bytes == 0) else 'read', bytes_sent=len(frame), wire_time=self.frame_time(len(frame) + response_bytes),
+			                    wait_time=sent_time - start_time, sleep_time=end_time - sent_time, total_time=end_time - start_time)
+
+	# same as scarf_uart_slave.receive, only bytes that have already arrived are read so port.read never blocks
+	async def receive_async(self, min_bytes, max_bytes, wait_time, idle_time=None):
+		if (idle_time is None):
+			idle_time = self.frame_time(self.num_addr_bytes + 1)
+		deadline = time.perf_counter() + wait_time
+		response = bytearray()
+		while (len(response) < min_bytes):
+			in_waiting = self.port.in_waiting
+			if (in_waiting > 0):
+				response.extend(self.port.read(min(in_waiting, max_bytes - len(response))))
+			elif (time.perf_counter() >= deadline):
+				break
+			else:
+				await self.readable(deadline - time.perf_counter())
+		idle_deadline = time.perf_counter() + idle_time
+		while (len(response) < max_bytes):
+			extra_bytes = min(self.port.in_waiting, max_bytes - len(response))
+			if (extra_bytes > 0):
+				response.extend(self.port.read(extra_bytes))
+				idle_deadline = time.perf_counter() + idle_time
+			elif (len(response) < min_bytes) or (time.perf_counter() >= idle_deadline):
+				break
+			else:
+				await self.readable(idle_deadline - time.perf_counter())
+		self.short_reads = 1 if (len(response) < min_bytes) else 0
+		return response
+
+	# same as scarf_uart_slave.read_response, port.read is never short here as only bytes that have arrived are read
+	async def read_response_async(self, frame, step_size, operation='read'):
+		start_time = time.perf_counter()
+		sleep_time = 0.0
+		self.port.reset_input_buffer() # a byte left over from an earlier response would be taken as read data
+		self.port.write(frame)
+		max_bytes = 1 + self.num_addr_bytes + step_size
+		if (self.framing == 'sleep'):
+			await asyncio.sleep(0.1)
+			sleep_time = time.perf_counter() - start_time
+			response = await self.receive_async(max_bytes, max_bytes, 0.0)
+			self.short_reads = 1 if (len(response) < 1 + step_size) else 0
+		else:
+			response = await self.receive_async(1 + step_size, max_bytes, self.frame_time(len(frame) + max_bytes) + self.usb_latency)
+		if (self.metrics is not None):
+			total_time = time.perf_counter() - start_time
+			self.metrics.record(self.slave_id, operation, bytes_sent=len(frame), bytes_received=len(response), wire_time=self.frame_time(len(frame) + len(response)),
+			                    wait_time=total_time - sleep_time, sleep_time=sleep_time, total_time=total_time, short_reads=self.short_reads)
+		return response
+
+	# this routine allows "num_bytes" to be larger than the self.read_buffer_max
+	async def read_list(self, addr=0x00, num_bytes=1, timeout=None):
+		if (self.debug == True):
+			print("Called read")
+		if (num_bytes == 0):
+			print("Error: num_bytes must be larger than zero")
+			return []
+		if self.shadow_valid(addr, num_bytes):
+			read_list = self.shadow[addr:addr + num_bytes]
+		else:
+			frames = self.read_frames(addr, num_bytes)
+			async def request(future):
+				read_list = []
+				for (frame, step_size) in frames:
+					if future.done():
+						return read_list
+					response = await self.read_response_async(frame, step_size)
+					if (len(response) < step_size + 1):
+						print("Error: expected {:d} response bytes from slave_id 0x{:02x}, received {:d}".format(step_size + 1,self.slave_id,len(response)))
+						read_list.extend(response[1:])
+					else:
+						read_list.extend(response[-step_size:])
+				return read_list
+			read_list = await self.submit(request, timeout)
+			if (len(read_list) == num_bytes):
+				self.update_shadow(addr, read_list)
+		if (self.debug == True):
+			address = addr
+			for read_byte in read_list:
+				print("Address 0x{:02x} Read data 0x{:02x}".format(address,read_byte))
+				address += 1
+		return read_list
+
+	# this routine allows "write_byte_list" to be larger than the self.write_buffer_max.
+	# The frames are built when the request runs, so earlier queued writes are in the shadow. The shadow is updated once
+	# every frame is sent, a cancelled or failed write marks the range as unknown
+	async def write_list(self, addr=0x00, write_byte_list=[], timeout=None):
+		async def request(future):
+			for (frame, step_size) in self.dirty_write_frames(addr, write_byte_list):
+				if future.done():
+					self.update_shadow(addr, [None] * len(write_byte_list))
+					return 1
+				await self.send_frame_async(frame)
+			self.update_shadow(addr, write_byte_list)
+			return 1
+		try:
+			await self.submit(request, timeout)
+		except (Exception, asyncio.CancelledError):
+			self.update_shadow(addr, [None] * len(write_byte_list))
+			raise
+		if (self.debug == True):
+			print("Called write_bytes")
+			address = addr
+			for write_byte in write_byte_list:
+				print("Wrote address 0x{:02x} data 0x{:02x}".format(address,write_byte))
+				address += 1
+		return 1
+
+	# same as scarf_uart_slave.send_bytes, used inside a request. Stops between frames once "future" is cancelled
+	async def send_bytes_async(self, addr, data, future):
+		for offset in range(0, len(data), self.write_buffer_max):
+			if future.done():
+				return
+			step_size = min(self.write_buffer_max, len(data) - offset)
+			frame = self.frame_header(self.slave_id & 0xFF, addr + offset, step_size)
+			frame[1 + self.num_addr_bytes:] = data[offset:offset + step_size]
+			await self.send_frame_async(frame)
+
+	# same as scarf_uart_slave.receive_bytes, used inside a request
+	async def receive_bytes_async(self, addr, out, future):
+		complete = True
+		for offset in range(0, len(out), self.read_buffer_max):
+			if future.done():
+				return False
+			step_size = min(self.read_buffer_max, len(out) - offset)
+			frame = self.frame_header((self.slave_id + 0x80) & 0xFF, addr + offset, 1)
+			frame[-1] = step_size
+			response = await self.read_response_async(frame, step_size)
+			if (len(response) < step_size + 1):
+				print("Error: expected {:d} response bytes from slave_id 0x{:02x}, received {:d}".format(step_size + 1,self.slave_id,len(response)))
+				num_received = max(len(response) - 1, 0)
+				out[offset:offset + num_received] = response[1:1 + num_received]
+				complete = False
+			else:
+				out[offset:offset + step_size] = memoryview(response)[-step_size:]
+		return complete
+
+	# see scarf_uart_slave.write_bytes
+	async def write_bytes(self, addr=0x00, data=b'', timeout=None):
+		data = self.byte_view(data)
+		if (data is None):
+			return None
+		if (len(self.shadow) > 0):
+			return await self.write_list(addr, data, timeout=timeout)
+		async def request(future):
+			await self.send_bytes_async(addr, data, future)
+			return 1
+		await self.submit(request, timeout)
+		if (self.debug == True):
+			print("Called write_bytes, wrote {:d} bytes from address 0x{:02x}".format(len(data),addr))
+		return 1
+
+	# see scarf_uart_slave.read_bytes
+	async def read_bytes(self, addr=0x00, num_bytes=1, out=None, timeout=None):
+		if (out is None):
+			out = bytearray(num_bytes)
+		if (num_bytes == 0):
+			print("Error: num_bytes must be larger than zero")
+			return out
+		view = self.byte_view(out, writable=True)
+		if (view is None):
+			return out
+		view = view[:num_bytes]
+		if (len(view) < num_bytes):
+			print("Error: out holds {:d} bytes, {:d} were requested".format(len(view),num_bytes))
+			return out
+		if self.shadow_valid(addr, num_bytes):
+			view[:] = bytes(self.shadow[addr:addr + num_bytes])
+		elif (await self.submit(lambda future: self.receive_bytes_async(addr, view, future), timeout)) and (len(self.shadow) > 0):
+			self.update_shadow(addr, view)
+		if (self.debug == True):
+			print("Called read_bytes, read {:d} bytes from address 0x{:02x}".format(num_bytes,addr))
+		return out
+
+	# see scarf_uart_slave.write_bytes_verified, "timeout" applies to each write and read back request
+	async def write_bytes_verified(self, addr=0x00, data=b'', retries=3, timeout=None):
+		data = self.byte_view(data)
+		if (data is None):
+			return None
+		await self.write_bytes(addr, data, timeout=timeout)
+		read_back = memoryview(bytearray(len(data)))
+		chunks = self.verify_chunks(len(data))
+		for attempt in range(retries + 1):
+			async def request(future):
+				checked = []
+				for (start, end, complete) in chunks:
+					if (attempt > 0):
+						await self.send_bytes_async(addr + start, data[start:end], future)
+					checked.append((start, end, await self.receive_bytes_async(addr + start, read_back[start:end], future)))
+				return checked
+			try:
+				chunks = self.failed_chunks(data, read_back, await self.submit(request, timeout))
+			except (Exception, asyncio.CancelledError):
+				self.update_shadow(addr, [None] * len(data))
+				raise
+			if (len(chunks) == 0):
+				return []
+		return self.unverified_addresses(addr, data, read_back, chunks, retries)
+
+	# see scarf_uart_slave.read_id
+	async def read_id(self, timeout=None):
+		byte0 = (self.slave_id + 0x80)
+		async def request(future):
+			self.port.reset_input_buffer()
+			self.port.reset_output_buffer()
+			return list(await self.read_response_async(bytearray([byte0] + [0x00, 0x01]), 1, operation='read_id'))
+		slave_id_list = await self.submit(request, timeout)
+		slave_id = slave_id_list[0] - 0x80
+		if (self.debug == True):
+			print("Slave ID is 0x{:02x}".format(slave_id))
+		return slave_id
+
+	# reload the whole shadow from the fpga
+	async def sync_shadow(self):
+		self.invalidate_shadow()
+		if (len(self.shadow) > 0):
+			await self.read_list(addr=0x00, num_bytes=len(self.shadow))
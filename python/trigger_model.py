@@ -0,0 +1,114 @@
+import numpy as np
+from pattern_compiler import clk_freq
+
+# Model of trigger.sv, to see where a trigger config fires without a board and a logic analyzer.
+# trigger_times() takes one input waveform and the 9 trigger register bytes of many configs (the same lists that
+# test_trigger.py and trigger_scenarios.py write) and returns when trigger_out rises for every config in one call:
+#
+#   from trigger_scenarios import scenarios, scenario_registers, scenario_waveform
+#   trigger_lists = [scenario_registers(scenarios[name])[0] for name in scenarios]
+#   times = trigger_times(scenario_waveform(), trigger_lists) # one row per scenario, seconds, nan padded
+#
+# The waveform is (edge times in seconds, initial level), as returned by pattern_compiler.pattern_waveform(), and is low
+# before time 0. Edges are rounded to the fpga clock. Times are from the input edges at trigger_in, so the 2 clock
+# synchronizer and the 1 clock trigger_out flop are included. The model is event driven, it loops over the pulses and
+# each step works on every config at once, so a sweep of thousands of configs takes about as long as one config.
+# check_trigger_model.py compares it with a clock by clock simulation of trigger.sv, run it after a change to either one.
+
+# same masks as the trigger regmap, unused register bits read back as zero
+register_masks = np.array([0x01, 0x07, 0x1F, 0x07, 0xFF, 0xFF, 0x01, 0x01, 0x01], dtype=np.int64)
+register_names = ['positive', 'type', 'stage1_count', 'time_base', 'count1', 'count2', 'longer_no_edge', 'trig_dur_sel', 'enable']
+
+sync_clocks = 2 # u_synchronizer_gpio_in, the edge detect sees an input edge 2 clocks later
+
+# every combination of the register values given as lists, the other registers come from "trigger_list".
+# Returns an (N, 9) array that can be passed to trigger_times(), e.g. register_sweep(trigger_list, count1=range(256), type=[1, 2])
+def register_sweep(trigger_list, **ranges):
+	for name in ranges:
+		if name not in register_names:
+			print("Error: {} is not a trigger register, use one of {}".format(name, register_names))
+			return None
+	values = [list(ranges[name]) if (name in ranges) else [trigger_list[index]] for (index, name) in enumerate(register_names)]
+	grid = np.meshgrid(*[np.asarray(value, dtype=np.int64) for value in values], indexing='ij')
+	return np.stack([axis.reshape(-1) for axis in grid], axis=1)
+
+# the waveform of a logic analyzer capture, one level per sample every "sample_period" seconds
+def samples_waveform(samples, sample_period):
+	levels = np.asarray(samples).astype(bool).astype(np.int8)
+	edge_samples = np.flatnonzero(np.diff(levels)) + 1
+	return (edge_samples * sample_period, int(levels[0]))
+
+# the clock (after the start edge is seen) at which count reaches each value, index [config][count], count 0 is at clock 1.
+# count only increments when the time_base counter reaches its final value, which is one less for the count1 - 1 and
+# count2 - 1 steps ("trigger_out will be driven 1 clock later"). With no stage1 division the toggle clock also loses a tick.
+def count_clocks(registers):
+	stage1 = np.maximum(registers[:, 2], 1)[:, None]
+	time_base = registers[:, 3][:, None]
+	count = np.arange(256, dtype=np.int64)[None, :]
+	step_count = count[:, :255] # count value during each step
+	end_count = 10 ** time_base - 1
+	short_step = ((registers[:, 4:5] > 0) & (registers[:, 1:2] > 0) & (step_count == registers[:, 4:5] - 1)) | \
+	             ((registers[:, 5:6] > 0) & (registers[:, 1:2] > 2) & (step_count == registers[:, 5:6] - 1))
+	step_length = np.where(short_step, end_count - 1, end_count)
+	clocks = stage1 * np.cumsum(step_length, axis=1) + 2 + np.where(stage1 == 1, step_count, 0)
+	clocks = np.concatenate([np.ones((len(registers), 1), dtype=np.int64), clocks], axis=1)
+	return np.where(time_base == 0, count * stage1 + 1, clocks)
+
+# trigger_out rising edge times (seconds) for each config in "trigger_lists" (a list of 9 byte register lists or an
+# (N, 9) array). Returns an (N, max number of triggers) array, rows are padded with nan
+def trigger_times(waveform, trigger_lists):
+	registers = np.asarray(trigger_lists, dtype=np.int64).reshape(-1, 9) & register_masks
+	(edge_times, initial_level) = waveform
+	edges = np.rint(np.sort(np.asarray(edge_times, dtype=np.float64)) * clk_freq).astype(np.int64)
+	levels = (initial_level + np.arange(1, len(edges) + 1)) & 1 # level after each edge
+	if (initial_level == 1):
+		edges = np.concatenate([[0], edges]) # rising edge at time 0
+		levels = np.concatenate([[1], levels])
+	edges = edges + sync_clocks
+	num_configs = len(registers)
+	counts = count_clocks(registers)
+	(positive, cfg_type, count1, count2, no_edge) = [registers[:, index] for index in [0, 1, 4, 5, 6]]
+	duration = np.where(registers[:, 7] == 1, 100, 10)
+	# cfg_enable low holds hold_trigger_source low, so pos_edge stays high while trigger_in is high and a positive type 0
+	# config keeps firing. After the final rising edge only the first of these triggers is returned
+	repeats = (registers[:, 8] == 0) & (cfg_type == 0) & (positive == 1)
+	max_triggers = len(edges)
+	if np.any(repeats):
+		max_triggers += int(np.sum(np.diff(edges)[levels[:-1] == 1] // 11 + 1))
+	times = np.full((num_configs, max(max_triggers, 1)), np.nan)
+	last_trigger = np.full(num_configs, -1000, dtype=np.int64)
+	num_triggers = np.zeros(num_configs, dtype=np.int64)
+	rows = np.arange(num_configs)
+	no_edge_clocks = np.where(cfg_type == 2, counts[rows, count1], counts[rows, count2])
+	for index in range(len(edges)):
+		start = edges[index]
+		# a start edge while trigger_out is high is ignored, as trigger_out clears en_time_base_cnt
+		starts = (registers[:, 8] == 1) & (positive == levels[index]) & (start > last_trigger + duration)
+		if (index + 1 < len(edges)):
+			opposite = edges[index + 1] - start
+			count = np.minimum(np.sum(counts[:, 1:] <= opposite, axis=1), 255)
+			trigger = np.where(cfg_type == 0, 0, np.inf)
+			trigger = np.where((cfg_type == 1) & (count <= count1), opposite, trigger)
+			trigger = np.where((cfg_type == 2) & (count >= count1), np.where(no_edge == 1, no_edge_clocks, opposite), trigger)
+			trigger = np.where((cfg_type == 3) & (count >= count1) & (count <= count2), opposite, trigger)
+			trigger = np.where((cfg_type == 4) & (count <= count1), opposite, trigger)
+			trigger = np.where((cfg_type == 4) & (count >= count2), np.minimum(trigger, np.where(no_edge == 1, no_edge_clocks, opposite)), trigger)
+		else:
+			# no opposite edge, only the no edge timeout can fire
+			trigger = np.where(cfg_type == 0, 0, np.inf)
+			trigger = np.where(((cfg_type == 2) | (cfg_type == 4)) & (no_edge == 1), no_edge_clocks, trigger)
+		fired = starts & np.isfinite(trigger)
+		trigger_clock = start + np.where(fired, trigger, 0).astype(np.int64)
+		times[rows[fired], num_triggers[fired]] = (trigger_clock[fired] + 1) / clk_freq # trigger_out is flopped
+		last_trigger = np.where(fired, trigger_clock, last_trigger)
+		num_triggers += fired
+		if (levels[index] == 1) and np.any(repeats):
+			end = edges[index + 1] if (index + 1 < len(edges)) else start + 1
+			first = np.maximum(start, last_trigger + duration + 1)
+			num_repeats = np.where(repeats & (first < end), (end - first + duration) // (duration + 1), 0)
+			(repeat_rows, repeat) = np.nonzero(np.arange(np.max(num_repeats))[None, :] < num_repeats[:, None])
+			trigger_clock = first[repeat_rows] + repeat * (duration[repeat_rows] + 1)
+			times[repeat_rows, num_triggers[repeat_rows] + repeat] = (trigger_clock + 1) / clk_freq
+			last_trigger = np.where(num_repeats > 0, first + (num_repeats - 1) * (duration + 1), last_trigger)
+			num_triggers += num_repeats
+	return times[:, :max(int(np.max(num_triggers, initial=0)), 1)]
@@ -0,0 +1,109 @@
+# Trigger test matrix, one entry per trigger type, polarity and no-edge setting.
+# Every scenario drives the same pattern from the block ram onto pat_gen_out[0], which is connected to trigger_in.
+# trigger_model.py predicts where each scenario fires, see scenario_triggers()
+
+import math
+
+# FROM RTL, PATTERN_GEN
+# assign registers[0] = cfg_end_address_pat_gen;             // this is one greater than the bram address
+# assign registers[1] = {6'd0,cfg_num_gpio_sel_pat_gen};     // 2'b00 is 1 pin, 2'b01 is 2 pins, 2'b10 is 4 pins and 2'b11 is 8 pins
+# assign registers[2] = {5'd0,cfg_timestep_sel_pat_gen};     // 3'b000 is 1x, 3'b001 is 10x, 3'b010 is 100x, 3'b011 is 1000x, etc...
+# assign registers[3] = {3'd0,cfg_stage1_count_sel_pat_gen}; // if your fpga clock is 27MHz, you can set this to 5'd27, a divide by 27 to get 1MHz
+# assign registers[4] = {7'd0,cfg_repeat_enable_pat_gen};    // when high this repeats the pattern until this bit is set low
+# assign registers[5] = {7'd0,cfg_enable_pat_gen};           // rising edge starts the pattern, make sure this bit is low before it is set high again
+
+# FROM RTL, TRIGGER
+# assign registers[0] = {7'd0,cfg_positive};       // if high, trigger on positive edge, else trigger on negative edge
+# assign registers[1] = {5'd0,cfg_type};           // types 0 thru 4... see type description
+# assign registers[2] = {3'd0,cfg_stage1_count};   // if your fpga clock is 27MHz, you can set this to 5'd27, a divide by 27 to get 1MHz
+# assign registers[3] = {5'd0,cfg_time_base};      // 3'b000 is 1x, 3'b001 is 10x, 3'b010 is 100x, 3'b011 is 1000x, etc...
+# assign registers[4] = cfg_count1;                // depending on the trigger type, this is the first count value
+# assign registers[5] = cfg_count2;                // depending on the trigger type, this is the second count value
+# assign registers[6] = {7'd0,cfg_longer_no_edge}; // a high value enables a trigger without an edge, a timeout is used
+# assign registers[7] = {7'd0,cfg_trig_dur_sel};   // a high value makes trigger_out 100 clocks wide, else 10 clocks
+# assign registers[8] = {7'd0,cfg_enable};         // a high value enables triggers to be driven
+
+pat_gen_stage1    = 0 # no division
+pat_gen_time_base = 3 # 10us
+trigger_stage1    = 0 # no division
+trigger_time_base = 2 # 1us
+trig_dur_sel      = 1 # 100 clocks
+
+# pat_gen_out[0] is the msb first, 10us per bit. pattern_gen.sv also sends the byte at cfg_end_address_pat_gen,
+# so the final zero byte is written too, otherwise whatever was left in the block ram there is driven
+pattern = [0b11101101, 0b11101010, 0b00111110, 0b00000000]
+
+# positive, type, count1, count2 and longer_no_edge are the trigger registers that change between scenarios.
+# disable_pat_gen writes cfg_enable_pat_gen low once the pattern is done (pattern_time() after the enable), as only its rising
+# edge starts the pattern. It must not be sent while the pattern is active, a low enable stops pattern_gen.sv mid-pattern with the
+# pins frozen and pattern_active stuck high, which blocks pat_gen and bram until the next rising edge
+scenarios = {
+	'type0_positive'         : { 'positive': 1, 'type': 0, 'count1':  0, 'count2':  0, 'longer_no_edge': 0, 'disable_pat_gen': True,
+	                             'description': "pattern will trigger on positive edges, pattern is in 1us steps" },
+	'type0_negative'         : { 'positive': 0, 'type': 0, 'count1':  0, 'count2':  0, 'longer_no_edge': 0, 'disable_pat_gen': True,
+	                             'description': "pattern will trigger on negative edges, pattern is in 1us steps" },
+	'type1_positive'         : { 'positive': 1, 'type': 1, 'count1': 18, 'count2':  0, 'longer_no_edge': 0, 'disable_pat_gen': True,
+	                             'description': "pattern will trigger on positive pulses shorter than 18us (on the falling edge), pattern is in 10us steps, trigger is in 1us steps" },
+	'type1_negative'         : { 'positive': 0, 'type': 1, 'count1': 18, 'count2':  0, 'longer_no_edge': 0, 'disable_pat_gen': True,
+	                             'description': "pattern will trigger on negative pulses shorter than 18us (on the rising edge), pattern is in 10us steps, trigger is in 1us steps" },
+	'type2_positive'         : { 'positive': 1, 'type': 2, 'count1': 18, 'count2':  0, 'longer_no_edge': 0, 'disable_pat_gen': False,
+	                             'description': "pattern will trigger on positive pulses longer than 18us (on the falling edge), pattern is in 10us steps, trigger is in 1us steps" },
+	'type2_positive_no_edge' : { 'positive': 1, 'type': 2, 'count1': 18, 'count2':  0, 'longer_no_edge': 1, 'disable_pat_gen': True,
+	                             'description': "pattern will trigger on positive pulses longer than 18us (as soon as 18us is reached, no edge), pattern is in 10us steps, trigger is in 1us steps" },
+	'type2_negative'         : { 'positive': 0, 'type': 2, 'count1': 18, 'count2':  0, 'longer_no_edge': 0, 'disable_pat_gen': True,
+	                             'description': "pattern will trigger on negative pulses longer than 18us (on the rising edge), pattern is in 10us steps, trigger is in 1us steps" },
+	'type2_negative_no_edge' : { 'positive': 0, 'type': 2, 'count1': 18, 'count2':  0, 'longer_no_edge': 1, 'disable_pat_gen': True,
+	                             'description': "pattern will trigger on negative pulses longer than 18us (as soon as 18us is reached, no edge), pattern is in 10us steps, trigger is in 1us steps" },
+	'type3_positive'         : { 'positive': 1, 'type': 3, 'count1': 18, 'count2': 28, 'longer_no_edge': 0, 'disable_pat_gen': True,
+	                             'description': "pattern will trigger on positive pulses longer than 18us and less than 28us (on the falling edge), pattern is in 10us steps, trigger is in 1us steps" },
+	'type3_negative'         : { 'positive': 0, 'type': 3, 'count1': 18, 'count2': 32, 'longer_no_edge': 0, 'disable_pat_gen': True,
+	                             'description': "pattern will trigger on negative pulses longer than 18us and less than 32us (on the rising edge), pattern is in 10us steps, trigger is in 1us steps" },
+	'type4_positive'         : { 'positive': 1, 'type': 4, 'count1': 18, 'count2': 28, 'longer_no_edge': 0, 'disable_pat_gen': True,
+	                             'description': "pattern will trigger on positive pulses less than 18us OR greater than 28us (on the falling edge), pattern is in 10us steps, trigger is in 1us steps" },
+	'type4_positive_no_edge' : { 'positive': 1, 'type': 4, 'count1': 18, 'count2': 29, 'longer_no_edge': 1, 'disable_pat_gen': True,
+	                             'description': "pattern will trigger on positive pulses less than 18us OR greater than 28us (as soon as 28us is reached, no edge), pattern is in 10us steps, trigger is in 1us steps" },
+	'type4_negative'         : { 'positive': 0, 'type': 4, 'count1': 18, 'count2': 28, 'longer_no_edge': 0, 'disable_pat_gen': True,
+	                             'description': "pattern will trigger on negative pulses less than 18us OR greater than 28us (on the rising edge), pattern is in 10us steps, trigger is in 1us steps" },
+	'type4_negative_no_edge' : { 'positive': 0, 'type': 4, 'count1': 18, 'count2': 28, 'longer_no_edge': 1, 'disable_pat_gen': True,
+	                             'description': "pattern will trigger on negative pulses less than 18us OR greater than 28us (as soon as 28us is reached, no edge), pattern is in 10us steps, trigger is in 1us steps" },
+}
+
+# the register byte lists of a scenario, trigger registers 0 to 8, the bram pattern and pat_gen registers 0 to 5
+def scenario_registers(scenario):
+	#                   positive,             type,             stage1_count,   time_base,         count1,             count2,             longer_no_edge,             trig_dur_sel, enable
+	trigger_list = [scenario['positive'], scenario['type'], trigger_stage1, trigger_time_base, scenario['count1'], scenario['count2'], scenario['longer_no_edge'], trig_dur_sel, 1]
+	#                   end_address,  num_gpio, timestep,          stage1_count,   repeat_enable, enable
+	pat_gen_list = [len(pattern) - 1, 0,    pat_gen_time_base, pat_gen_stage1, 0,             1]
+	return (trigger_list, list(pattern), pat_gen_list)
+
+# queue the writes of a scenario, in the same order as the original test_trigger.py functions. The final write is the
+# pat_gen enable that starts the pattern, send the batch and wait pattern_time() before queue_scenario_end()
+def queue_scenario(batch, trigger, pat_gen, bram, scenario):
+	(trigger_list, bram_list, pat_gen_list) = scenario_registers(scenario)
+	batch.write_list(trigger, addr=0, write_byte_list=trigger_list)
+	batch.write_list(bram,    addr=0, write_byte_list=bram_list)
+	batch.write_list(pat_gen, addr=0, write_byte_list=pat_gen_list)
+
+# queue the pat_gen disable of a scenario, in a new batch that is only sent once the pattern is done
+def queue_scenario_end(batch, pat_gen, scenario):
+	if (scenario['disable_pat_gen'] == True):
+		batch.write_list(pat_gen, addr=5, write_byte_list=[0]) # disable pat_gen, needed as positive edge starts pattern
+
+# time the pattern takes at the 100MHz fpga clock, the byte at the end address is sent too
+def pattern_time(scenario):
+	(trigger_list, bram_list, pat_gen_list) = scenario_registers(scenario)
+	steps_per_byte = 8 >> pat_gen_list[1]
+	return (pat_gen_list[0] + 1) * steps_per_byte * max(pat_gen_list[3], 1) * (10 ** pat_gen_list[2]) / 100.0E6
+
+# the pattern on pat_gen_out[0] as (edge times in seconds, initial level), for trigger_model.trigger_times()
+def scenario_waveform(scenario=None):
+	from pattern_compiler import pattern_waveform
+	(trigger_list, bram_list, pat_gen_list) = scenario_registers(scenarios['type0_positive'] if (scenario is None) else scenario)
+	return pattern_waveform(bram_list, pat_gen_list, pin=0)
+
+# trigger_out rising edge times (seconds from the first pattern step) that trigger.sv should give for a scenario
+def scenario_triggers(scenario):
+	from trigger_model import trigger_times
+	(trigger_list, bram_list, pat_gen_list) = scenario_registers(scenario)
+	times = trigger_times(scenario_waveform(scenario), [trigger_list])[0]
+	return [float(time) for time in times if not math.isnan(time)]